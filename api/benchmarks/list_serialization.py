@@ -0,0 +1,96 @@
+"""Per-page cost of serializing list responses, old path against the new ones.
+
+Needs no database: pages of ORM entities and of column rows are built in
+memory. Run from the ``api`` directory::
+
+    python -m benchmarks.list_serialization --rows 100
+
+``response_model`` is what the list routes did before: validate the
+entities into schemas, dump them to Python and encode with json.dumps.
+``adapter`` is dump_list with FAST_LIST_SERIALIZATION off, ``orjson``
+with it on.
+"""
+import argparse
+import json
+import timeit
+import uuid
+from collections import namedtuple
+from datetime import datetime
+from typing import List
+import orjson
+from pydantic import TypeAdapter
+from src.models import MovementType, Product, StockMovement
+from src.schemas import Product as ProductSchema, StockMovement as StockMovementSchema
+
+def product_values(index: int) -> dict:
+    now = datetime.utcnow()
+    return {
+        "id": uuid.uuid4(),
+        "name": f"Cotton shirt {index}",
+        "sku": f"SKU-{index:08d}",
+        "barcode": f"BC-{index:08d}",
+        "description": "Regular fit, long sleeves",
+        "category_id": uuid.uuid4(),
+        "cost_price": 12.5,
+        "sale_price": 29.9,
+        "min_stock": 5,
+        "image_url": None,
+        "attributes": {"size": "M", "color": "navy", "material": {"cotton": 0.95, "elastane": 0.05}},
+        "created_at": now,
+        "updated_at": now,
+    }
+
+def movement_values(index: int) -> dict:
+    now = datetime.utcnow()
+    return {
+        "id": uuid.uuid4(),
+        "product_id": uuid.uuid4(),
+        "type": MovementType.OUT,
+        "quantity": index % 7 + 1,
+        "location": "main",
+        "reference_id": uuid.uuid4(),
+        "notes": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+ENDPOINTS = {
+    "products": (Product, ProductSchema, product_values),
+    "movements": (StockMovement, StockMovementSchema, movement_values),
+}
+
+def response_model(adapter: TypeAdapter, entities: List[object]) -> bytes:
+    validated = adapter.validate_python(entities, from_attributes=True)
+    return json.dumps(adapter.dump_python(validated, mode="json")).encode()
+
+def with_adapter(adapter: TypeAdapter, entities: List[object]) -> bytes:
+    return adapter.dump_json(adapter.validate_python(entities, from_attributes=True))
+
+def with_orjson(rows: List[tuple]) -> bytes:
+    return orjson.dumps([row._asdict() for row in rows], default=str)
+
+def main(args: argparse.Namespace) -> None:
+    for name, (model, schema, make_values) in ENDPOINTS.items():
+        adapter = TypeAdapter(List[schema])
+        page = [make_values(index) for index in range(args.rows)]
+        entities = [model(**values) for values in page]
+        Row = namedtuple("Row", list(schema.model_fields))
+        rows = [Row(**{field: values[field] for field in Row._fields}) for values in page]
+
+        timings = {
+            "response_model": lambda: response_model(adapter, entities),
+            "adapter": lambda: with_adapter(adapter, entities),
+            "orjson": lambda: with_orjson(rows),
+        }
+        baseline = None
+        print(f"\n{name}, {args.rows} rows per page")
+        for label, run in timings.items():
+            per_page = min(timeit.repeat(run, number=args.number, repeat=5)) / args.number * 1e6
+            baseline = baseline or per_page
+            print(f"  {label:15} {per_page:9.1f} us/page  {baseline / per_page:5.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100, help="Rows per page")
+    parser.add_argument("--number", type=int, default=200, help="Pages per timing run")
+    main(parser.parse_args())
@@ -0,0 +1,65 @@
+"""Latency of a non-auth endpoint while logins hash passwords concurrently.
+
+Start the API, create a user, then run from the ``api`` directory::
+
+    python -m benchmarks.login_latency --email bench@example.com --password secret
+
+Run it once against a checkout from before the hashing pool (bcrypt on
+the event loop) and once against this one: with hashing on the loop the
+probe's p99 grows with every concurrent login, with the pool it stays
+near its idle value.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+import httpx
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+async def login_forever(client: httpx.AsyncClient, email: str, password: str, stop: asyncio.Event) -> int:
+    logins = 0
+    while not stop.is_set():
+        response = await client.post("/api/v1/token", data={"username": email, "password": password})
+        if response.status_code == 200:
+            logins += 1
+    return logins
+
+async def probe(client: httpx.AsyncClient, path: str, requests: int) -> List[float]:
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await client.get(path)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+async def main(args: argparse.Namespace) -> None:
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        for concurrency in args.concurrency:
+            stop = asyncio.Event()
+            logins = [
+                asyncio.create_task(login_forever(client, args.email, args.password, stop))
+                for _ in range(concurrency)
+            ]
+            samples = await probe(client, args.probe, args.requests)
+            stop.set()
+            completed = sum(await asyncio.gather(*logins))
+            print(
+                f"logins={concurrency:3d}  completed={completed:5d}  "
+                f"p50={statistics.median(samples):7.1f}ms  "
+                f"p99={percentile(samples, 0.99):7.1f}ms  "
+                f"max={max(samples):7.1f}ms"
+            )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--probe", default="/api/v1/openapi.json", help="Endpoint that needs no auth")
+    parser.add_argument("--requests", type=int, default=500, help="Probe requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[0, 4, 16, 64])
+    asyncio.run(main(parser.parse_args()))
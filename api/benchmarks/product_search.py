@@ -0,0 +1,91 @@
+"""Search latency at catalogue sizes: ``ILIKE '%term%'`` against ranked_search.
+
+Seeds synthetic products into the database in DATABASE_URL, so point it
+at a scratch database, then run from the ``api`` directory::
+
+    DATABASE_URL=postgresql+asyncpg://.../bench python -m benchmarks.product_search
+
+The catalogue grows to each size in turn (100k and 1M by default); the
+rows are removed afterwards unless ``--keep`` is given.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+from sqlalchemy import delete, select, text
+from src.core.database import async_session, engine, init_db
+from src.models import Category, Product
+from src.services.product_search import ranked_search
+
+BENCH_CATEGORY = "benchmark-search"
+
+WORDS = ["cotton", "linen", "denim", "wool", "silk", "shirt", "jacket", "dress", "skirt", "trousers"]
+
+# Typed prefixes, a typo, a SKU prefix and an exact barcode
+TERMS = ["cott", "denim jack", "jakcet", "SKU-00004", "BC-00000042"]
+
+SEED_PRODUCTS = text("""
+    INSERT INTO products (id, name, sku, barcode, description, category_id,
+                          cost_price, sale_price, min_stock, attributes, created_at, updated_at)
+    SELECT gen_random_uuid(),
+           (:words)[1 + i % 10] || ' ' || (:words)[1 + (i / 10) % 10] || ' ' || i,
+           'SKU-' || lpad(i::text, 8, '0'),
+           'BC-' || lpad(i::text, 8, '0'),
+           'Synthetic product ' || i || ' in ' || (:words)[1 + (i / 100) % 10],
+           :category_id, 10, 20, 0, '{}'::jsonb, now(), now()
+    FROM generate_series(:start, :stop - 1) AS i
+""")
+
+async def timed(query, repeat: int) -> List[float]:
+    samples = []
+    async with async_session() as session:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await session.execute(query)
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def summary(samples: List[float]) -> str:
+    ordered = sorted(samples)
+    return f"p50={statistics.median(ordered):8.2f}ms  p95={ordered[int(len(ordered) * 0.95)]:8.2f}ms"
+
+async def main(args: argparse.Namespace) -> None:
+    await init_db()
+    async with async_session() as session:
+        category = Category(name=BENCH_CATEGORY)
+        session.add(category)
+        await session.commit()
+
+    seeded = 0
+    try:
+        for size in sorted(args.sizes):
+            async with engine.begin() as conn:
+                for start in range(seeded, size, 100_000):
+                    await conn.execute(SEED_PRODUCTS, {
+                        "words": WORDS, "category_id": category.id,
+                        "start": start, "stop": min(start + 100_000, size),
+                    })
+                await conn.execute(text("ANALYZE products"))
+            seeded = size
+
+            print(f"\n{size:,} products")
+            for term in TERMS:
+                before = select(Product).where(Product.name.ilike(f"%{term}%")).limit(20)
+                after = ranked_search(term, 20)
+                print(f"  {term!r:14}  ilike {summary(await timed(before, args.repeat))}"
+                      f"  |  ranked {summary(await timed(after, args.repeat))}")
+    finally:
+        if not args.keep:
+            async with async_session() as session:
+                await session.execute(delete(Product).where(Product.category_id == category.id))
+                await session.execute(delete(Category).where(Category.id == category.id))
+                await session.commit()
+        await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=50, help="Runs per query")
+    parser.add_argument("--keep", action="store_true", help="Leave the seeded products in place")
+    asyncio.run(main(parser.parse_args()))
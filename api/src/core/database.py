@@ -1,12 +1,69 @@
-from typing import AsyncGenerator
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import AsyncGenerator, Optional
+from sqlalchemy import Column, DateTime, text
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from src.core.config import settings
+from src.core.metrics import Histogram
+
+class PoolStats:
+    """Counters for connection checkouts from the engine pool."""
+
+    def __init__(self):
+        # Seconds spent waiting for a connection
+        self.wait_time = Histogram(
+            [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+        )
+        self.overflow_events = 0
+        self.timeouts = 0
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records checkout wait time, overflow and timeouts."""
+
+    stats = PoolStats()
+
+    def _do_get(self):
+        overflow_before = self.overflow()
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            self.stats.wait_time.observe(time.perf_counter() - start)
+            if self.overflow() > max(overflow_before, 0):
+                self.stats.overflow_events += 1
+
+connect_args = {}
+if settings.DB_STATEMENT_TIMEOUT_MS:
+    connect_args["server_settings"] = {
+        "statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS),
+    }
 
 # Create async engine
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+engine = create_async_engine(
+    settings.DATABASE_URL,
+    echo=settings.DB_ECHO,
+    poolclass=InstrumentedPool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    connect_args=connect_args,
+)
 
-# Create async session factory
+# Read-only handlers share the pool but run in autocommit mode, so they
+# skip the BEGIN/COMMIT round trips of a transactional session
+read_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+
+# Create async session factories
 async_session = sessionmaker(
     engine,
     class_=AsyncSession,
@@ -15,13 +72,32 @@ async_session = sessionmaker(
     autoflush=False,
 )
 
+async_read_session = sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autoflush=False,
+)
+
 # Create base class for models
 Base = declarative_base()
 
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """A datetime as stored: naive UTC. Aware values are converted, naive ones kept."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
 async def init_db() -> None:
     """Initialize database by creating all tables."""
     async with engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         await conn.run_sync(Base.metadata.create_all)
+        # create_all leaves existing types and tables alone; later additions need these
+        await conn.execute(text("ALTER TYPE movementtype ADD VALUE IF NOT EXISTS 'TRANSFER'"))
+        await conn.execute(text(
+            "ALTER TABLE stock_movements ADD COLUMN IF NOT EXISTS seq bigint GENERATED BY DEFAULT AS IDENTITY"
+        ))
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """Dependency for getting async database session."""
@@ -35,6 +111,25 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
         finally:
             await session.close()
 
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """Dependency for read-only handlers; never opens a transaction or commits."""
+    async with async_read_session() as session:
+        yield session
+
+def get_pool_stats() -> dict:
+    pool = engine.sync_engine.pool
+    stats = InstrumentedPool.stats
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "overflow_events": stats.overflow_events,
+        "timeouts": stats.timeouts,
+        "wait_time_seconds": stats.wait_time.snapshot(),
+    }
+
 # Database mixins
 class TimestampMixin:
     """Mixin for adding created_at and updated_at fields."""
@@ -48,4 +143,4 @@ class TimestampMixin:
 
 class UUIDMixin:
     """Mixin for using UUID as primary key."""
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
\ No newline at end of file
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
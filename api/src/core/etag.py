@@ -0,0 +1,39 @@
+import hashlib
+from fastapi import Request, Response
+from sqlalchemy import Sequence, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Clients must revalidate, but may reuse their copy on 304
+CACHE_CONTROL = "private, no-cache"
+
+def make_etag(*parts: object) -> str:
+    """Strong ETag over the given version parts."""
+    digest = hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=12)
+    return f'"{digest.hexdigest()}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak comparison against If-None-Match, as RFC 9110 requires for GET."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+def etag_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=etag_headers(etag))
+
+async def collection_version(db: AsyncSession, version: Sequence) -> int:
+    """Current version of a collection whose writes bump ``version``."""
+    return await db.scalar(text(f"SELECT last_value FROM {version.name}"))
+
+async def bump_collection_version(db: AsyncSession, version: Sequence) -> None:
+    """Mark a collection changed; call after the writing transaction commits.
+
+    nextval is not transactional, so bumping before commit could hand out
+    the new version together with the old rows.
+    """
+    await db.execute(select(version.next_value()))
@@ -0,0 +1,215 @@
+import asyncio
+import json
+import logging
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple, Type
+from redis.exceptions import RedisError
+from sqlalchemy.exc import InterfaceError, OperationalError
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_exponential
+from src.core.config import settings
+from src.core.redis import get_redis
+from src.worker import celery_app, run_async
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying: the database or Redis went away mid-job
+TRANSIENT_ERRORS: Tuple[Type[BaseException], ...] = (
+    OperationalError,
+    InterfaceError,
+    RedisError,
+    ConnectionError,
+)
+
+# A job record as stored and returned by the jobs API
+Record = Dict[str, Any]
+
+class JobCancelled(Exception):
+    pass
+
+class RedisJobStore:
+    """Job records in Redis, shared by the API and the workers.
+
+    Only the process running a job writes its record; cancellation is a
+    separate flag so a cancel request never races a progress update.
+    """
+
+    key_prefix = "job:"
+    cancel_prefix = "job-cancel:"
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    async def save(self, record: Record) -> None:
+        await get_redis().set(
+            self.key_prefix + record["id"], json.dumps(record, default=str), ex=self.ttl
+        )
+
+    async def load(self, job_id: str) -> Optional[Record]:
+        raw = await get_redis().get(self.key_prefix + job_id)
+        return json.loads(raw) if raw is not None else None
+
+    async def request_cancel(self, job_id: str) -> None:
+        await get_redis().set(self.cancel_prefix + job_id, 1, ex=self.ttl)
+
+    async def cancel_requested(self, job_id: str) -> bool:
+        return bool(await get_redis().exists(self.cancel_prefix + job_id))
+
+class MemoryJobStore:
+    """In-process job records, for eager mode."""
+
+    def __init__(self):
+        self.records: Dict[str, Record] = {}
+        self.cancelled: Set[str] = set()
+
+    async def save(self, record: Record) -> None:
+        # Round-trip through JSON so results look as they would from Redis
+        self.records[record["id"]] = json.loads(json.dumps(record, default=str))
+
+    async def load(self, job_id: str) -> Optional[Record]:
+        return self.records.get(job_id)
+
+    async def request_cancel(self, job_id: str) -> None:
+        self.cancelled.add(job_id)
+
+    async def cancel_requested(self, job_id: str) -> bool:
+        return job_id in self.cancelled
+
+job_store = MemoryJobStore() if settings.JOBS_EAGER else RedisJobStore(settings.JOB_TTL_SECONDS)
+
+class JobContext:
+    """Handed to a running job for progress reports and cancellation checks."""
+
+    def __init__(self, record: Record):
+        self.record = record
+
+    @property
+    def id(self) -> str:
+        return self.record["id"]
+
+    async def check_cancelled(self) -> None:
+        if await job_store.cancel_requested(self.id):
+            raise JobCancelled()
+
+    async def progress(self, done: int, total: Optional[int] = None) -> None:
+        """Record progress; also the point where a cancel request takes effect."""
+        self.record["progress"] = {"done": done, "total": total}
+        await job_store.save(self.record)
+        await self.check_cancelled()
+
+@dataclass
+class JobDefinition:
+    name: str
+    fn: Callable[..., Awaitable[Any]]
+    max_attempts: int
+    retry_on: Tuple[Type[BaseException], ...]
+    celery_task: Any = None
+
+jobs: Dict[str, JobDefinition] = {}
+
+def job(
+    name: str,
+    max_attempts: Optional[int] = None,
+    retry_on: Tuple[Type[BaseException], ...] = TRANSIENT_ERRORS,
+) -> Callable[[Callable[..., Awaitable[Any]]], JobDefinition]:
+    """Register ``async def fn(ctx, **kwargs)`` as a background job.
+
+    Keyword arguments travel as JSON, so pass ids and dates as strings.
+    The return value becomes the job's result.
+    """
+    def register(fn: Callable[..., Awaitable[Any]]) -> JobDefinition:
+        definition = JobDefinition(
+            name=name,
+            fn=fn,
+            max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+            retry_on=retry_on,
+        )
+
+        def run(job_id: str, kwargs: dict) -> None:
+            run_async(execute(definition, job_id, kwargs))
+
+        definition.celery_task = celery_app.task(name=name)(run)
+        jobs[name] = definition
+        return definition
+    return register
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+async def execute(definition: JobDefinition, job_id: str, kwargs: dict) -> None:
+    """Run a job, retrying transient errors, and record how it ended."""
+    record = await job_store.load(job_id)
+    if record is None:
+        # Expired before a worker picked it up
+        return
+    ctx = JobContext(record)
+    try:
+        await ctx.check_cancelled()
+        record.update(status="running", started_at=_now())
+        await job_store.save(record)
+
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(definition.max_attempts),
+            wait=wait_exponential(multiplier=1, max=30),
+            retry=retry_if_exception_type(definition.retry_on),
+            reraise=True,
+        )
+        async for attempt in retrying:
+            with attempt:
+                record["attempts"] = attempt.retry_state.attempt_number
+                result = await definition.fn(ctx, **kwargs)
+        record.update(status="completed", result=result)
+    except JobCancelled:
+        record["status"] = "cancelled"
+    except Exception as e:
+        logger.exception("Job %s (%s) failed", job_id, definition.name)
+        record.update(status="failed", error=str(e))
+    record["finished_at"] = _now()
+    await job_store.save(record)
+
+# Eager jobs running in this process; the loop only keeps weak references
+_local_tasks: Dict[str, asyncio.Task] = {}
+
+def _new_record(definition: JobDefinition, owner_id: Optional[Any] = None) -> Record:
+    return {
+        "id": str(uuid.uuid4()),
+        "name": definition.name,
+        "owner_id": str(owner_id) if owner_id else None,
+        "status": "pending",
+        "progress": None,
+        "result": None,
+        "error": None,
+        "attempts": 0,
+        "created_at": _now(),
+        "started_at": None,
+        "finished_at": None,
+    }
+
+async def enqueue(definition: JobDefinition, owner_id: Optional[Any] = None, **kwargs) -> Record:
+    """Record a pending job and hand it to a worker (or this process when eager)."""
+    record = _new_record(definition, owner_id)
+    await job_store.save(record)
+
+    if settings.JOBS_EAGER:
+        task = asyncio.create_task(execute(definition, record["id"], kwargs))
+        _local_tasks[record["id"]] = task
+        task.add_done_callback(lambda _: _local_tasks.pop(record["id"], None))
+    else:
+        definition.celery_task.apply_async(args=[record["id"], kwargs], task_id=record["id"])
+    return record
+
+async def cancel(job_id: str) -> None:
+    """Ask a job to stop; it ends at its next progress report, or before it starts."""
+    await job_store.request_cancel(job_id)
+
+async def _run_scheduled(name: str) -> None:
+    definition = jobs[name]
+    record = _new_record(definition)
+    await job_store.save(record)
+    await execute(definition, record["id"], {})
+
+@celery_app.task(name="jobs.run_scheduled")
+def run_scheduled(name: str) -> None:
+    """Celery beat entry point: run a registered job here, with a job record like any other."""
+    run_async(_run_scheduled(name))
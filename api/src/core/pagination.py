@@ -0,0 +1,55 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional, Sequence, Tuple
+from uuid import UUID
+from fastapi import HTTPException, Response
+from sqlalchemy import Select, tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(created_at: datetime, id: UUID) -> str:
+    raw = json.dumps([created_at.isoformat(), str(id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), UUID(id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid cursor"
+        )
+
+def paginate(
+    query: Select,
+    model: Any,
+    limit: int,
+    skip: int = 0,
+    cursor: Optional[str] = None,
+) -> Select:
+    """Order newest first by (created_at, id) and apply the page window.
+
+    With a cursor the page starts strictly after the cursor's row, which the
+    (created_at, id) indexes answer without scanning skipped rows. Without
+    one the legacy offset is used.
+    """
+    query = query.order_by(model.created_at.desc(), model.id.desc())
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        query = query.where(tuple_(model.created_at, model.id) < tuple_(created_at, id))
+    else:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+def next_cursor_headers(items: Sequence[Any], limit: int) -> Dict[str, str]:
+    """Headers exposing the cursor for the following page when this page is full."""
+    if len(items) < limit:
+        return {}
+    last = items[-1]
+    return {NEXT_CURSOR_HEADER: encode_cursor(last.created_at, last.id)}
+
+def set_next_cursor(response: Response, items: Sequence[Any], limit: int) -> None:
+    response.headers.update(next_cursor_headers(items, limit))
@@ -0,0 +1,138 @@
+import json
+import time
+from dataclasses import dataclass
+from typing import Iterable, Optional
+from uuid import UUID
+from redis.exceptions import RedisError
+from sqlalchemy import event, inspect
+from sqlalchemy.exc import MissingGreenlet
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.util import await_only
+from src.core.cache import TTLCache
+from src.core.config import settings
+from src.core.redis import get_redis
+from src.models import User, UserRole
+
+@dataclass(frozen=True)
+class Principal:
+    """The subset of a user that authorization checks need."""
+    id: UUID
+    role: UserRole
+    is_active: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(id=user.id, role=UserRole(user.role), is_active=bool(user.is_active))
+
+class PrincipalCache:
+    """Caches decoded tokens and user principals so auth skips the users table.
+
+    Entries live in an in-process LRU with a TTL and, when PRINCIPAL_CACHE_USE_REDIS
+    is set, in Redis as a shared second level. Invalidation clears both; other
+    workers' in-process entries converge within PRINCIPAL_CACHE_TTL_SECONDS.
+    """
+
+    key_prefix = "principal:"
+
+    def __init__(self, maxsize: int, ttl: int, use_redis: bool):
+        self.ttl = ttl
+        self.use_redis = use_redis
+        self.tokens = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.principals = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get_token_subject(self, token: str) -> Optional[UUID]:
+        return self.tokens.get(token)
+
+    def set_token_subject(self, token: str, user_id: UUID, exp: Optional[int]) -> None:
+        ttl = self.ttl
+        if exp is not None:
+            ttl = min(ttl, exp - time.time())
+        if ttl > 0:
+            self.tokens.set(token, user_id, ttl=ttl)
+
+    async def get(self, user_id: UUID) -> Optional[Principal]:
+        principal = self.principals.get(user_id)
+        if principal is not None or not self.use_redis:
+            return principal
+
+        try:
+            raw = await get_redis().get(f"{self.key_prefix}{user_id}")
+        except RedisError:
+            return None
+        if raw is None:
+            return None
+
+        data = json.loads(raw)
+        principal = Principal(id=user_id, role=UserRole(data["role"]), is_active=data["is_active"])
+        self.principals.set(user_id, principal)
+        return principal
+
+    async def set(self, principal: Principal) -> None:
+        self.principals.set(principal.id, principal)
+        if not self.use_redis:
+            return
+        try:
+            await get_redis().set(
+                f"{self.key_prefix}{principal.id}",
+                json.dumps({"role": principal.role.value, "is_active": principal.is_active}),
+                ex=self.ttl,
+            )
+        except RedisError:
+            pass
+
+    async def invalidate(self, *user_ids: UUID) -> None:
+        for user_id in user_ids:
+            self.principals.delete(user_id)
+        if not self.use_redis or not user_ids:
+            return
+        try:
+            await get_redis().delete(*(f"{self.key_prefix}{user_id}" for user_id in user_ids))
+        except RedisError:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "tokens": self.tokens.stats(),
+            "principals": self.principals.stats(),
+            "redis": self.use_redis,
+        }
+
+principal_cache = PrincipalCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    use_redis=settings.PRINCIPAL_CACHE_USE_REDIS,
+)
+
+@event.listens_for(User, "after_update")
+def _collect_changed_principal(mapper, connection, target: User) -> None:
+    """Note users whose role or active flag changed; they are dropped on commit."""
+    state = inspect(target)
+    if not (state.attrs.role.history.has_changes() or state.attrs.is_active.history.has_changes()):
+        return
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_principals", set()).add(target.id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_principals(session: Session) -> None:
+    """Drop cached principals once the change is visible to other requests.
+
+    Invalidating at flush would let a concurrent request re-cache the old
+    role from the still-uncommitted row for a whole TTL.
+    """
+    user_ids: Iterable[UUID] = session.info.pop("changed_principals", ())
+    if not user_ids:
+        return
+    invalidation = principal_cache.invalidate(*user_ids)
+    try:
+        # AsyncSession runs commit inside a greenlet that can await
+        await_only(invalidation)
+    except MissingGreenlet:
+        # Plain synchronous session: only this process's entries can go
+        invalidation.close()
+        for user_id in user_ids:
+            principal_cache.principals.delete(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_principals(session: Session) -> None:
+    session.info.pop("changed_principals", None)
@@ -0,0 +1,51 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+class ProcessPool:
+    """Runs CPU-bound work on a lazily started process pool.
+
+    Libraries such as weasyprint and Pillow hold the GIL for much of their
+    work, so threads would not keep the event loop responsive; separate
+    processes also run in parallel.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.in_flight = 0
+        self.completed = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Call ``fn(*args)`` in the pool; ``fn`` must be a module-level function."""
+        self.in_flight += 1
+        try:
+            if multiprocessing.current_process().daemon:
+                # Celery's pool processes are daemonic and may not fork a
+                # pool of their own; they are off the request path anyway
+                result = await asyncio.to_thread(fn, *args)
+            else:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(self._get_executor(), fn, *args)
+            self.completed += 1
+            return result
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,23 @@
+from typing import Optional
+from redis.asyncio import Redis
+from src.core.config import settings
+
+_client: Optional[Redis] = None
+
+def get_redis() -> Redis:
+    """Return the process-wide async Redis client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = Redis.from_url(
+            settings.REDIS_URL,
+            decode_responses=True,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+            socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT_SECONDS,
+        )
+    return _client
+
+async def close_redis() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -0,0 +1,206 @@
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+from urllib.parse import urlencode
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from redis.exceptions import RedisError
+from src.core.cache import TTLCache
+from src.core.config import settings
+from src.core.etag import etag_matches, not_modified
+from src.core.redis import get_redis
+
+# A cached entry: the JSON body plus any headers the route sets
+Entry = Dict[str, object]
+
+# Keys per DEL command when invalidating
+DELETE_BATCH_SIZE = 1_000
+
+class ResponseCache:
+    """Read-through cache of serialized responses with tag-based invalidation.
+
+    Entries live in Redis so every worker shares them; each tag keeps a set
+    of the keys that depend on it. While Redis is unreachable the cache
+    serves from an in-process LRU instead and retries Redis after
+    ``redis_retry_seconds``. Invalidations that cannot reach Redis are
+    remembered and replayed before Redis is read again, so a brief outage
+    does not leave other workers serving stale entries for a whole TTL.
+    Concurrent misses for one key share a single load.
+    """
+
+    key_prefix = "response:"
+    tag_prefix = "response-tag:"
+
+    def __init__(self, ttl: int, local_size: int, redis_retry_seconds: int = 30):
+        self.ttl = ttl
+        self.redis_retry_seconds = redis_retry_seconds
+        self.local = TTLCache(maxsize=local_size, ttl=ttl)
+        self._local_tags: Dict[str, Set[str]] = {}
+        self._local_tag_adds = 0
+        self._pending_tags: Set[str] = set()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._redis_down_until = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.redis_errors = 0
+
+    def _redis_available(self) -> bool:
+        return time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self) -> None:
+        self.redis_errors += 1
+        self._redis_down_until = time.monotonic() + self.redis_retry_seconds
+
+    async def _delete_tags(self, tags: Iterable[str]) -> None:
+        redis = get_redis()
+        tag_keys = [self.tag_prefix + tag for tag in tags]
+        async with redis.pipeline(transaction=False) as pipe:
+            for tag_key in tag_keys:
+                pipe.smembers(tag_key)
+            members = await pipe.execute()
+        keys = [self.key_prefix + key for key in {key for tag_members in members for key in tag_members}]
+        # A bulk import invalidates one tag per product; keep each DEL bounded
+        keys += tag_keys
+        for start in range(0, len(keys), DELETE_BATCH_SIZE):
+            await redis.delete(*keys[start:start + DELETE_BATCH_SIZE])
+
+    async def _replay_invalidations(self) -> None:
+        """Apply invalidations missed while Redis was down; raises RedisError."""
+        if not self._pending_tags:
+            return
+        tags = set(self._pending_tags)
+        await self._delete_tags(tags)
+        self._pending_tags -= tags
+
+    def _track_local(self, key: str, tags: Iterable[str]) -> None:
+        for tag in tags:
+            self._local_tags.setdefault(tag, set()).add(key)
+            self._local_tag_adds += 1
+        # Drop keys whose entries expired or were evicted, once per
+        # local_size additions so the index cannot outgrow the cache
+        if self._local_tag_adds >= self.local.maxsize:
+            self._local_tag_adds = 0
+            for tag in list(self._local_tags):
+                keys = {key for key in self._local_tags[tag] if key in self.local}
+                if keys:
+                    self._local_tags[tag] = keys
+                else:
+                    del self._local_tags[tag]
+
+    async def _get(self, key: str) -> Optional[Entry]:
+        if self._redis_available():
+            try:
+                await self._replay_invalidations()
+                raw = await get_redis().get(self.key_prefix + key)
+                return json.loads(raw) if raw is not None else None
+            except RedisError:
+                self._redis_failed()
+        return self.local.get(key)
+
+    async def _set(self, key: str, entry: Entry, tags: Iterable[str]) -> None:
+        if self._redis_available():
+            try:
+                await self._replay_invalidations()
+                async with get_redis().pipeline(transaction=False) as pipe:
+                    pipe.set(self.key_prefix + key, json.dumps(entry), ex=self.ttl)
+                    for tag in tags:
+                        pipe.sadd(self.tag_prefix + tag, key)
+                        pipe.expire(self.tag_prefix + tag, self.ttl)
+                    await pipe.execute()
+                return
+            except RedisError:
+                self._redis_failed()
+        self.local.set(key, entry)
+        self._track_local(key, tags)
+
+    async def get_or_load(
+        self,
+        key: str,
+        tags: List[str],
+        loader: Callable[[], Awaitable[Entry]],
+    ) -> Entry:
+        entry = await self._get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        # Single flight: only the first concurrent miss runs the loader
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            entry = await loader()
+            await self._set(key, entry, tags)
+            future.set_result(entry)
+            return entry
+        except BaseException as e:
+            future.set_exception(e)
+            # Waiters re-raise it; mark it retrieved for the asyncio logger
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def invalidate(self, *tags: str) -> None:
+        for tag in tags:
+            for key in self._local_tags.pop(tag, ()):
+                self.local.delete(key)
+
+        # Tried even while backing off: a write must reach the shared
+        # entries as soon as Redis answers again
+        self._pending_tags.update(tags)
+        try:
+            await self._replay_invalidations()
+        except RedisError:
+            self._redis_failed()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "redis_errors": self.redis_errors,
+            "redis_available": self._redis_available(),
+            "pending_invalidations": len(self._pending_tags),
+            "local": self.local.stats(),
+        }
+
+response_cache = ResponseCache(
+    ttl=settings.RESPONSE_CACHE_TTL_SECONDS,
+    local_size=settings.RESPONSE_CACHE_LOCAL_SIZE,
+)
+
+def json_body(adapter: TypeAdapter, value: object) -> str:
+    """Serialize ORM objects through a schema adapter, straight to JSON."""
+    return adapter.dump_json(adapter.validate_python(value, from_attributes=True)).decode()
+
+def cache_key(request: Request) -> str:
+    """Route path plus sorted query parameters, so parameter order does not matter."""
+    params = sorted(request.query_params.multi_items())
+    return f"{request.url.path}?{urlencode(params)}"
+
+async def cached_response(
+    request: Request,
+    tags: List[str],
+    loader: Callable[[], Awaitable[Entry]],
+) -> Response:
+    """Serve a JSON response through the cache; ``loader`` builds it on a miss."""
+    if settings.RESPONSE_CACHE_ENABLED:
+        entry = await response_cache.get_or_load(cache_key(request), tags, loader)
+    else:
+        entry = await loader()
+    etag = entry["headers"].get("ETag")
+    if etag and etag_matches(request, etag):
+        return not_modified(etag)
+    return Response(
+        content=entry["body"],
+        media_type="application/json",
+        headers=entry["headers"],
+    )
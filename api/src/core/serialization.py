@@ -0,0 +1,32 @@
+from typing import Any, Sequence, Type
+import orjson
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import Result, Select, select
+from src.core.config import settings
+
+def list_select(model: Any, schema: Type[BaseModel]) -> Select:
+    """Base query for a list endpoint serialized as ``schema``.
+
+    On the fast path only the schema's columns are selected, so no ORM
+    entities are built and the rows can be dumped as they are.
+    """
+    if settings.FAST_LIST_SERIALIZATION:
+        return select(*(getattr(model, name) for name in schema.model_fields))
+    return select(model)
+
+def fetch_items(result: Result) -> Sequence[Any]:
+    if settings.FAST_LIST_SERIALIZATION:
+        return result.all()
+    return result.scalars().all()
+
+def dump_list(adapter: TypeAdapter, items: Sequence[Any]) -> bytes:
+    """Serialize a page fetched with list_select/fetch_items to JSON.
+
+    Column rows go straight through orjson; entities are validated once
+    by the adapter, instead of FastAPI's response_model validation followed
+    by jsonable_encoder and json.dumps.
+    """
+    if settings.FAST_LIST_SERIALIZATION:
+        # Decimal becomes a string, matching pydantic's JSON output
+        return orjson.dumps([row._asdict() for row in items], default=str)
+    return adapter.dump_json(adapter.validate_python(items, from_attributes=True))
@@ -0,0 +1,80 @@
+from typing import AsyncIterator, List, Optional
+from fastapi import Request
+from multipart.multipart import MultipartParser, parse_options_header
+
+# Allowance for the multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD = 16_384
+
+class InvalidUpload(Exception):
+    pass
+
+def declared_length(request: Request) -> Optional[int]:
+    """The request's Content-Length, when it sent a valid one."""
+    try:
+        return int(request.headers["content-length"])
+    except (KeyError, ValueError):
+        return None
+
+class _FilePart:
+    """Parser callbacks picking out the content of one file field."""
+
+    def __init__(self, field: str):
+        self.field = field.encode()
+        self.header_field = b""
+        self.header_value = b""
+        self.in_field = False
+        self.found = False
+        self.pending: List[bytes] = []
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self.header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self.header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        if self.header_field.lower() == b"content-disposition":
+            _, options = parse_options_header(self.header_value)
+            self.in_field = options.get(b"name") == self.field and b"filename" in options
+        self.header_field = self.header_value = b""
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self.in_field:
+            self.pending.append(data[start:end])
+
+    def on_part_end(self) -> None:
+        if self.in_field:
+            self.in_field = False
+            self.found = True
+
+    def callbacks(self) -> dict:
+        return {
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+async def multipart_file(request: Request, field: str = "file") -> AsyncIterator[bytes]:
+    """Yield one file field of a multipart/form-data body as it arrives.
+
+    The body is parsed straight off the connection instead of being
+    spooled first, so a consumer that stops iterating stops the upload
+    there. Reading ends as soon as the field is complete.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise InvalidUpload("Expected a multipart/form-data body")
+
+    part = _FilePart(field)
+    parser = MultipartParser(boundary, part.callbacks())
+    async for chunk in request.stream():
+        parser.write(chunk)
+        for data in part.pending:
+            yield data
+        part.pending.clear()
+        if part.found:
+            return
+    raise InvalidUpload(f"No file in field '{field}'")
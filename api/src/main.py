@@ -2,7 +2,14 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from src.core.config import settings
 from src.core.database import init_db
-from src.routes import auth, users, products, inventory, suppliers
+from src.core.pagination import NEXT_CURSOR_HEADER
+from src.core.redis import close_redis
+from src.core.security import password_hasher
+from src.services.image_storage import image_pool
+from src.services.po_documents import document_renderer
+from src.services.stock_events import stock_event_hub
+from src.services.category_tree import ensure_closure
+from src.routes import auth, users, products, categories, inventory, suppliers, internal, jobs, images
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -19,18 +26,35 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
 # Include routers
 app.include_router(auth.router, prefix=settings.API_V1_STR, tags=["auth"])
 app.include_router(users.router, prefix=settings.API_V1_STR, tags=["users"])
 app.include_router(products.router, prefix=settings.API_V1_STR, tags=["products"])
-app.include_router(inventory.router, prefix=settings.API_V1_STR, tags=["inventory"])
-app.include_router(suppliers.router, prefix=settings.API_V1_STR, tags=["suppliers"])
+app.include_router(categories.router, prefix=f"{settings.API_V1_STR}/categories", tags=["categories"])
+# Inventory and suppliers get their own prefixes: products' GET / and
+# GET /{product_id} would otherwise capture /, /{supplier_id} and
+# single-segment paths such as /levels, /alerts and /analytics
+app.include_router(inventory.router, prefix=f"{settings.API_V1_STR}/inventory", tags=["inventory"])
+app.include_router(suppliers.router, prefix=f"{settings.API_V1_STR}/suppliers", tags=["suppliers"])
+app.include_router(jobs.router, prefix=f"{settings.API_V1_STR}/jobs", tags=["jobs"])
+app.include_router(images.router, prefix=f"{settings.API_V1_STR}/images", tags=["images"])
+app.include_router(internal.router, prefix=f"{settings.API_V1_STR}/internal", tags=["internal"])
 
 @app.on_event("startup")
 async def startup_event():
     await init_db()
+    await ensure_closure()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    password_hasher.shutdown()
+    document_renderer.shutdown()
+    image_pool.shutdown()
+    await stock_event_hub.close()
+    await close_redis()
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,7 +1,7 @@
 from datetime import datetime
 import uuid
-from sqlalchemy import Column, String, DateTime, Boolean, ForeignKey, Integer, Float, Enum
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy import Column, String, Date, DateTime, BigInteger, Boolean, ForeignKey, Integer, Float, Numeric, Enum, Index, Computed, UniqueConstraint, Sequence, Identity, text
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
 from sqlalchemy.orm import relationship
 from src.core.database import Base, TimestampMixin, UUIDMixin
 import enum
@@ -32,8 +32,46 @@ class Category(Base, UUIDMixin, TimestampMixin):
     children = relationship("Category", back_populates="parent")
     products = relationship("Product", back_populates="category")
 
+class CategoryClosure(Base):
+    """Every (ancestor, descendant) pair of the category tree, self included at depth 0.
+
+    Subtree queries become one indexed lookup instead of a recursive walk.
+    """
+    __tablename__ = "category_closure"
+    __table_args__ = (
+        Index("ix_category_closure_descendant_depth", "descendant_id", "depth"),
+    )
+
+    ancestor_id = Column(UUID(as_uuid=True), ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+    descendant_id = Column(UUID(as_uuid=True), ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+    depth = Column(Integer, nullable=False)
+
 class Product(Base, UUIDMixin, TimestampMixin):
     __tablename__ = "products"
+    __table_args__ = (
+        # Keyset pagination on (created_at, id)
+        Index("ix_products_created_at_id", "created_at", "id"),
+        Index("ix_products_category_created_at_id", "category_id", "created_at", "id"),
+        # Product search: full-text with prefix matching plus trigram typo tolerance
+        Index("ix_products_search_vector", "search_vector", postgresql_using="gin"),
+        Index(
+            "ix_products_name_trgm", "name",
+            postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_products_sku_trgm", "sku",
+            postgresql_using="gin", postgresql_ops={"sku": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_products_barcode_trgm", "barcode",
+            postgresql_using="gin", postgresql_ops={"barcode": "gin_trgm_ops"},
+        ),
+        # Attribute filters: attributes @> '{"size": "M"}'
+        Index(
+            "ix_products_attributes", "attributes",
+            postgresql_using="gin", postgresql_ops={"attributes": "jsonb_path_ops"},
+        ),
+    )
 
     name = Column(String, nullable=False)
     sku = Column(String, unique=True, index=True, nullable=False)
@@ -45,6 +83,16 @@ class Product(Base, UUIDMixin, TimestampMixin):
     min_stock = Column(Integer, default=0)
     image_url = Column(String)
     attributes = Column(JSONB)  # For size, color, material, etc.
+    search_vector = Column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(sku, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(barcode, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(description, '')), 'B')",
+            persisted=True,
+        ),
+    )
 
     # Relationships
     category = relationship("Category", back_populates="products")
@@ -53,6 +101,9 @@ class Product(Base, UUIDMixin, TimestampMixin):
 
 class Supplier(Base, UUIDMixin, TimestampMixin):
     __tablename__ = "suppliers"
+    __table_args__ = (
+        Index("ix_suppliers_created_at_id", "created_at", "id"),
+    )
 
     name = Column(String, nullable=False)
     contact_name = Column(String)
@@ -64,8 +115,38 @@ class Supplier(Base, UUIDMixin, TimestampMixin):
     # Relationships
     purchase_orders = relationship("PurchaseOrder", back_populates="supplier")
 
+class ProductAttributeValue(Base):
+    """One row per product attribute, flattened from Product.attributes for faceting."""
+    __tablename__ = "product_attribute_values"
+    __table_args__ = (
+        Index("ix_product_attribute_values_product_id", "product_id"),
+    )
+
+    key = Column(String, primary_key=True)
+    value = Column(String, primary_key=True)
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+
+class AttributeFacetCount(Base):
+    """Precomputed product counts per category and attribute value."""
+    __tablename__ = "attribute_facet_counts"
+
+    category_id = Column(UUID(as_uuid=True), ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+    key = Column(String, primary_key=True)
+    value = Column(String, primary_key=True)
+    product_count = Column(Integer, nullable=False)
+
 class StockLevel(Base, UUIDMixin, TimestampMixin):
     __tablename__ = "stock_levels"
+    __table_args__ = (
+        Index("ix_stock_levels_created_at_id", "created_at", "id"),
+        # One row per product and location, the conflict target for upserts
+        UniqueConstraint("product_id", "location", name="uq_stock_levels_product_location"),
+        # Per-location totals and alerts read one location's rows, index-only for totals
+        Index(
+            "ix_stock_levels_location_product", "location", "product_id",
+            postgresql_include=["quantity"],
+        ),
+    )
 
     product_id = Column(UUID(as_uuid=True), ForeignKey("products.id"), nullable=False)
     quantity = Column(Integer, default=0)
@@ -74,10 +155,46 @@ class StockLevel(Base, UUIDMixin, TimestampMixin):
     # Relationships
     product = relationship("Product", back_populates="stock_levels")
 
+# Bumped after every committed stock level change; versions list ETags
+stock_levels_version = Sequence("stock_levels_version_seq", metadata=Base.metadata)
+
+class StockAlertSeverity(int, enum.Enum):
+    LOW = 1       # At or below min_stock
+    CRITICAL = 2  # At or below half of min_stock
+    OUT = 3       # Nothing on hand
+
+class ProductStockSummary(Base):
+    """Per-product stock total and low-stock flag, kept current on every movement."""
+    __tablename__ = "product_stock_summaries"
+    __table_args__ = (
+        # Serves the alerts listing: only low rows, most severe first
+        Index(
+            "ix_product_stock_summaries_alerts",
+            "severity", "shortfall", "product_id",
+            postgresql_where=text("is_low"),
+        ),
+    )
+
+    product_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("products.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    total_stock = Column(Integer, nullable=False, default=0)
+    min_stock = Column(Integer, nullable=False, default=0)
+    shortfall = Column(Integer, nullable=False, default=0)  # min_stock - total_stock
+    severity = Column(Integer, nullable=False, default=0)
+    is_low = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Relationships
+    product = relationship("Product")
+
 class MovementType(str, enum.Enum):
     IN = "in"        # Purchase
     OUT = "out"      # Sale
     ADJUST = "adjust" # Manual adjustment
+    TRANSFER = "transfer"  # Between locations; one row per side, negative at the source
 
 class PurchaseOrderStatus(str, enum.Enum):
     DRAFT = "draft"
@@ -87,22 +204,85 @@ class PurchaseOrderStatus(str, enum.Enum):
 
 class StockMovement(Base, UUIDMixin, TimestampMixin):
     __tablename__ = "stock_movements"
+    __table_args__ = (
+        Index("ix_stock_movements_created_at_id", "created_at", "id"),
+        Index("ix_stock_movements_product_created_at_id", "product_id", "created_at", "id"),
+        Index("ix_stock_movements_location_created_at_id", "location", "created_at", "id"),
+    )
 
     product_id = Column(UUID(as_uuid=True), ForeignKey("products.id"), nullable=False)
+    location = Column(String, nullable=False, default="main", server_default="main")
     type = Column(Enum(MovementType), nullable=False)
     quantity = Column(Integer, nullable=False)
     reference_id = Column(UUID(as_uuid=True))  # ID of PO or Sale
     notes = Column(String)
+    idempotency_key = Column(String, unique=True)  # Client-supplied, dedupes retries
+    # Order in which movements were applied to their level. Batch items share
+    # created_at, and writers stamp created_at before waiting for the level
+    # lock, so only this orders movements of one product and location.
+    seq = Column(BigInteger, Identity(), nullable=False)
 
     # Relationships
     product = relationship("Product", back_populates="stock_movements")
 
+class ProductMovementDaily(Base):
+    """Daily movement totals per product, location and type."""
+    __tablename__ = "product_movement_daily"
+    __table_args__ = (
+        Index("ix_product_movement_daily_product_day", "product_id", "day"),
+    )
+
+    day = Column(Date, primary_key=True)
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    location = Column(String, primary_key=True)
+    type = Column(Enum(MovementType), primary_key=True)
+    quantity = Column(BigInteger, nullable=False, default=0)
+    movement_count = Column(Integer, nullable=False, default=0)
+
+class CategoryMovementDaily(Base):
+    """Daily movement totals per category, location and type, for dashboard charts."""
+    __tablename__ = "category_movement_daily"
+
+    day = Column(Date, primary_key=True)
+    category_id = Column(UUID(as_uuid=True), ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+    location = Column(String, primary_key=True)
+    type = Column(Enum(MovementType), primary_key=True)
+    quantity = Column(BigInteger, nullable=False, default=0)
+    movement_count = Column(Integer, nullable=False, default=0)
+
+class StockSnapshot(Base, UUIDMixin):
+    """A checkpoint of every stock level, the starting point for as-of queries."""
+    __tablename__ = "stock_snapshots"
+
+    taken_at = Column(DateTime, nullable=False, unique=True, index=True)
+
+    # Relationships
+    items = relationship("StockSnapshotItem", back_populates="snapshot")
+
+class StockSnapshotItem(Base):
+    __tablename__ = "stock_snapshot_items"
+
+    snapshot_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("stock_snapshots.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    location = Column(String, primary_key=True)
+    quantity = Column(Integer, nullable=False)
+
+    # Relationships
+    snapshot = relationship("StockSnapshot", back_populates="items")
+
 class PurchaseOrder(Base, UUIDMixin, TimestampMixin):
     __tablename__ = "purchase_orders"
+    __table_args__ = (
+        Index("ix_purchase_orders_supplier_created_at_id", "supplier_id", "created_at", "id"),
+    )
 
     supplier_id = Column(UUID(as_uuid=True), ForeignKey("suppliers.id"), nullable=False)
     status = Column(String, nullable=False)  # draft, ordered, received, cancelled
-    total_amount = Column(Float, nullable=False)
+    total_amount = Column(Numeric(12, 2), nullable=False)
     notes = Column(String)
 
     # Relationships
@@ -115,7 +295,7 @@ class PurchaseOrderItem(Base, UUIDMixin, TimestampMixin):
     po_id = Column(UUID(as_uuid=True), ForeignKey("purchase_orders.id"), nullable=False)
     product_id = Column(UUID(as_uuid=True), ForeignKey("products.id"), nullable=False)
     quantity = Column(Integer, nullable=False)
-    unit_price = Column(Float, nullable=False)
+    unit_price = Column(Numeric(10, 2), nullable=False)
     received_quantity = Column(Integer, default=0)
 
     # Relationships
@@ -0,0 +1,51 @@
+from typing import List, Optional
+from uuid import UUID
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from src.core.pagination import paginate
+from src.models import PurchaseOrder, PurchaseOrderItem
+
+def orders_with_items() -> Select:
+    """Base query for orders that will be serialized with their items.
+
+    selectinload fetches the items of every order on the page in one extra
+    query, instead of one lazy load per order (which AsyncSession forbids).
+    """
+    return select(PurchaseOrder).options(selectinload(PurchaseOrder.items))
+
+def orders_for_documents() -> Select:
+    """Orders with everything a rendered document shows: items, their
+    products and the supplier, in three batched queries."""
+    return select(PurchaseOrder).options(
+        selectinload(PurchaseOrder.items).selectinload(PurchaseOrderItem.product),
+        selectinload(PurchaseOrder.supplier),
+    )
+
+async def get_order(
+    db: AsyncSession,
+    order_id: UUID,
+    for_update: bool = False,
+) -> Optional[PurchaseOrder]:
+    query = orders_with_items().where(PurchaseOrder.id == order_id)
+    if for_update:
+        query = query.with_for_update(of=PurchaseOrder)
+    result = await db.execute(query.execution_options(populate_existing=True))
+    return result.scalar_one_or_none()
+
+async def get_orders(db: AsyncSession, order_ids: List[UUID]) -> List[PurchaseOrder]:
+    query = orders_with_items().where(PurchaseOrder.id.in_(order_ids))
+    result = await db.execute(query.order_by(PurchaseOrder.supplier_id, PurchaseOrder.id))
+    return result.scalars().all()
+
+async def list_supplier_orders(
+    db: AsyncSession,
+    supplier_id: UUID,
+    limit: int,
+    skip: int = 0,
+    cursor: Optional[str] = None,
+) -> List[PurchaseOrder]:
+    query = orders_with_items().where(PurchaseOrder.supplier_id == supplier_id)
+    query = paginate(query, PurchaseOrder, limit, skip=skip, cursor=cursor)
+    result = await db.execute(query)
+    return result.scalars().all()
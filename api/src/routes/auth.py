@@ -1,25 +1,38 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.core.config import settings
-from src.core.database import get_db
+from src.core.database import async_read_session, get_db
+from src.core.principals import Principal, principal_cache
+from src.core.security import HashingPoolFull, password_hasher
 from src.models import User, UserRole
 from src.schemas import Token, TokenData, UserCreate, User as UserSchema
 from sqlalchemy import select
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/token")
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+hashing_busy_exception = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Authentication service busy, please retry",
+    headers={"Retry-After": "1"},
+)
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+async def verify_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Return whether the password matches and, if so, an upgraded hash when needed."""
+    try:
+        return await password_hasher.verify_and_update(plain_password, hashed_password)
+    except HashingPoolFull:
+        raise hashing_busy_exception
+
+async def get_password_hash(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except HashingPoolFull:
+        raise hashing_busy_exception
 
 async def get_user(db: AsyncSession, email: str) -> Optional[User]:
     result = await db.execute(select(User).where(User.email == email))
@@ -34,30 +47,42 @@ def create_token(data: dict, expires_delta: timedelta) -> str:
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_db)
-) -> User:
+) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
+    user_id = principal_cache.get_token_subject(token)
+    if user_id is None:
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+            user_id = payload.get("sub")
+            if user_id is None:
+                raise credentials_exception
+            token_data = TokenData(user_id=user_id, exp=payload.get("exp"))
+        except JWTError:
             raise credentials_exception
-        token_data = TokenData(user_id=user_id, exp=payload.get("exp"))
-    except JWTError:
-        raise credentials_exception
-        
-    user = await db.get(User, token_data.user_id)
+        user_id = token_data.user_id
+        principal_cache.set_token_subject(token, user_id, payload.get("exp"))
+
+    principal = await principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+
+    # Cache miss: load the user in a short-lived session of our own so that
+    # cached requests never check out a database connection for auth
+    async with async_read_session() as session:
+        user = await session.get(User, user_id)
     if user is None:
         raise credentials_exception
-    return user
+    principal = Principal.from_user(user)
+    await principal_cache.set(principal)
+    return principal
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: Principal = Depends(get_current_user),
+) -> Principal:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
@@ -80,7 +105,7 @@ async def register(
         email=user_in.email,
         name=user_in.name,
         role=user_in.role,
-        hashed_password=get_password_hash(user_in.password)
+        hashed_password=await get_password_hash(user_in.password)
     )
     db.add(db_user)
     await db.commit()
@@ -93,13 +118,20 @@ async def login(
     db: AsyncSession = Depends(get_db)
 ) -> Token:
     user = await get_user(db, form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if user:
+        verified, new_hash = await verify_password(form_data.password, user.hashed_password)
+    if not user or not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Work factor changed since this hash was stored; persist the upgraded hash
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+    
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     refresh_token_expires = timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
     
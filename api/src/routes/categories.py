@@ -0,0 +1,120 @@
+import json
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.core.database import get_db, get_read_db
+from src.core.etag import etag_headers, make_etag
+from src.core.principals import Principal
+from src.core.response_cache import cached_response, response_cache
+from src.models import Category, UserRole
+from src.schemas import (
+    CategoryCreate,
+    CategoryUpdate,
+    Category as CategorySchema,
+    CategoryTreeNode,
+)
+from src.routes.auth import get_current_active_user
+from src.services.category_tree import (
+    add_to_closure,
+    category_tree,
+    is_descendant,
+    lock_hierarchy,
+    move_in_closure,
+)
+from uuid import UUID
+
+router = APIRouter()
+
+@router.get("/tree", response_model=List[CategoryTreeNode])
+async def get_category_tree(
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
+) -> Response:
+    """The whole category tree, nested, for navigation."""
+    async def load() -> dict:
+        body = json.dumps(await category_tree(db), default=str)
+        return {"body": body, "headers": etag_headers(make_etag(body))}
+    
+    return await cached_response(request, ["categories"], load)
+
+@router.post("/", response_model=CategorySchema)
+async def create_category(
+    category_in: CategoryCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_active_user)
+) -> Category:
+    if current_user.role == UserRole.VIEWER:
+        raise HTTPException(
+            status_code=403,
+            detail="Not enough permissions"
+        )
+    
+    if category_in.parent_id and not await db.get(Category, category_in.parent_id):
+        raise HTTPException(
+            status_code=404,
+            detail="Parent category not found"
+        )
+    
+    if category_in.parent_id:
+        # The new rows copy the parent's ancestors, which a move could be changing
+        await lock_hierarchy(db)
+    db_category = Category(**category_in.model_dump())
+    db.add(db_category)
+    await db.flush()
+    await add_to_closure(db, db_category.id, db_category.parent_id)
+    await db.commit()
+    await db.refresh(db_category)
+    await response_cache.invalidate("categories")
+    return db_category
+
+@router.put("/{category_id}", response_model=CategorySchema)
+async def update_category(
+    category_id: UUID,
+    category_in: CategoryUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_active_user)
+) -> Category:
+    """Update a category; a changed ``parent_id`` moves its whole subtree."""
+    if current_user.role == UserRole.VIEWER:
+        raise HTTPException(
+            status_code=403,
+            detail="Not enough permissions"
+        )
+    
+    category = await db.get(Category, category_id, with_for_update=True)
+    if not category:
+        raise HTTPException(
+            status_code=404,
+            detail="Category not found"
+        )
+    
+    update_data = category_in.model_dump(exclude_unset=True)
+    parent_id = update_data.get("parent_id", category.parent_id)
+    moved = parent_id != category.parent_id
+    if moved:
+        await lock_hierarchy(db)
+    if moved and parent_id:
+        if not await db.get(Category, parent_id):
+            raise HTTPException(
+                status_code=404,
+                detail="Parent category not found"
+            )
+        if await is_descendant(db, parent_id, category_id):
+            raise HTTPException(
+                status_code=400,
+                detail="A category cannot be moved under itself or its descendants"
+            )
+    
+    for field, value in update_data.items():
+        setattr(category, field, value)
+    if moved:
+        await move_in_closure(db, category_id, parent_id)
+    
+    await db.commit()
+    await db.refresh(category)
+    await response_cache.invalidate("categories")
+    if moved:
+        # Subtree product listings depend on the hierarchy
+        await response_cache.invalidate("products")
+    return category
@@ -0,0 +1,45 @@
+import os
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from src.core.config import settings
+from src.core.etag import etag_matches
+from src.services.image_storage import IMAGE_NAME, MEDIA_TYPES, image_path
+
+router = APIRouter()
+
+@router.get("/{name}")
+async def get_image(
+    name: str,
+    request: Request,
+    size: Optional[int] = None,
+) -> Response:
+    """Serve a stored product image, or one of its thumbnails.
+
+    Names are content hashes, so a name always refers to the same bytes:
+    clients may cache for a year and the ETag never changes. Public, so
+    the URLs work in plain <img> tags.
+    """
+    if not IMAGE_NAME.match(name) or (size and size not in settings.IMAGE_THUMBNAIL_SIZES):
+        raise HTTPException(
+            status_code=404,
+            detail="Image not found"
+        )
+    
+    etag = f'"{name.split(".")[0]}-{size or "original"}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.IMAGE_CACHE_MAX_AGE}, immutable",
+    }
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    
+    path = image_path(name, thumbnail=size)
+    if not os.path.isfile(path):
+        raise HTTPException(
+            status_code=404,
+            detail="Image not found"
+        )
+    # FileResponse sends the file with sendfile where the server supports it
+    media_type = "image/jpeg" if size else MEDIA_TYPES[name.rsplit(".", 1)[1]]
+    return FileResponse(path, media_type=media_type, headers=headers)
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException
+from src.core.database import get_pool_stats
+from src.core.principals import Principal, principal_cache
+from src.core.response_cache import response_cache
+from src.core.security import password_hasher
+from src.models import UserRole
+from src.services.image_storage import image_pool
+from src.services.po_documents import document_renderer
+from src.services.stock_events import stock_event_hub
+from src.routes.auth import get_current_active_user
+
+router = APIRouter()
+
+@router.get("/stats")
+async def get_internal_stats(
+    current_user: Principal = Depends(get_current_active_user)
+) -> dict:
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=403,
+            detail="Not enough permissions"
+        )
+    
+    return {
+        "db_pool": get_pool_stats(),
+        "password_hashing": password_hasher.stats(),
+        "po_documents": document_renderer.stats(),
+        "image_processing": image_pool.stats(),
+        "principal_cache": principal_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "stock_events": stock_event_hub.stats(),
+    }
@@ -1,30 +1,95 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select, func
+from datetime import date, datetime
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy import Date, and_, cast, literal_column, select, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.core.database import get_db
-from src.models import Product, StockLevel, StockMovement, MovementType, User, UserRole
+from src.core.config import settings
+from src.core.database import get_db, get_read_db, naive_utc
+from src.core.etag import (
+    bump_collection_version,
+    collection_version,
+    etag_headers,
+    etag_matches,
+    make_etag,
+    not_modified,
+)
+from src.core.jobs import enqueue
+from src.core.pagination import next_cursor_headers, paginate
+from src.core.response_cache import cache_key
+from src.core.serialization import dump_list, fetch_items, list_select
+from src.core.principals import Principal
+from src.models import (
+    Product,
+    ProductMovementDaily,
+    ProductStockSummary,
+    StockAlertSeverity,
+    StockLevel,
+    StockMovement,
+    MovementType,
+    UserRole,
+    stock_levels_version,
+)
 from src.schemas import (
     StockLevel as StockLevelSchema,
+    StockLevelAsOf,
     StockMovement as StockMovementSchema,
-    StockMovementBase,
+    StockMovementCreate,
+    StockMovementBatch,
+    StockMovementBatchResult,
+    StockTransferCreate,
 )
 from src.routes.auth import get_current_active_user
+from src.services.category_tree import category_filter
+from src.services.stock_alerts import alert_severity
+from src.services.exports import EXPORT_MEDIA_TYPES, EXPORT_QUERIES, stream_export
+from src.services.stock_events import STREAM_ID, publish_stock_events, stream_stock_events
+from src.services.stock_rollups import category_rollup
+from src.services.stock_snapshots import nearest_snapshot, stock_levels_as_of, take_snapshot
+from src.services.stock_ledger import (
+    InsufficientStock,
+    apply_movement,
+    apply_movement_batch,
+    pop_stock_events,
+    run_in_transaction,
+    transfer_stock,
+)
+from src.tasks import backfill_rollups_job, export_job, reconcile_alerts_job
 from uuid import UUID
 
 router = APIRouter()
 
+stock_level_list_adapter = TypeAdapter(List[StockLevelSchema])
+stock_movement_list_adapter = TypeAdapter(List[StockMovementSchema])
+stock_level_as_of_list_adapter = TypeAdapter(List[StockLevelAsOf])
+
 @router.get("/levels", response_model=List[StockLevelSchema])
 async def list_stock_levels(
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
     product_id: Optional[UUID] = None,
     location: Optional[str] = None,
     low_stock: bool = False,
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-) -> List[StockLevel]:
-    query = select(StockLevel)
+    as_of: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
+) -> Response:
+    if as_of:
+        return await stock_levels_as_of_response(db, as_of, skip, limit, product_id, location, cursor, low_stock)
+
+    # Answer revalidations from the collection version alone, before any
+    # rows are loaded or serialized
+    version = await collection_version(db, stock_levels_version)
+    etag = make_etag(version, cache_key(request))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    query = list_select(StockLevel, StockLevelSchema)
     
     if product_id:
         query = query.where(StockLevel.product_id == product_id)
@@ -34,36 +99,163 @@ async def list_stock_levels(
         # Join with Product to check min_stock threshold
         query = query.join(Product).where(StockLevel.quantity <= Product.min_stock)
     
-    query = query.offset(skip).limit(limit)
+    query = paginate(query, StockLevel, limit, skip=skip, cursor=cursor)
     result = await db.execute(query)
-    return result.scalars().all()
+    levels = fetch_items(result)
+    return Response(
+        content=dump_list(stock_level_list_adapter, levels),
+        media_type="application/json",
+        headers={**next_cursor_headers(levels, limit), **etag_headers(etag)},
+    )
+
+async def stock_levels_as_of_response(
+    db: AsyncSession,
+    as_of: datetime,
+    skip: int,
+    limit: int,
+    product_id: Optional[UUID],
+    location: Optional[str],
+    cursor: Optional[str],
+    low_stock: bool,
+) -> Response:
+    if cursor or low_stock:
+        raise HTTPException(
+            status_code=400,
+            detail="as_of supports only product_id, location, skip and limit"
+        )
+    as_of = naive_utc(as_of)
+
+    snapshot = await nearest_snapshot(db, as_of)
+    query = stock_levels_as_of(as_of, snapshot, product_id=product_id, location=location)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return Response(
+        content=dump_list(stock_level_as_of_list_adapter, result.all()),
+        media_type="application/json",
+    )
+
+@router.post("/snapshots", status_code=201)
+async def create_stock_snapshot(
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_active_user)
+) -> dict:
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=403,
+            detail="Not enough permissions"
+        )
+    snapshot = await take_snapshot(db)
+    await db.commit()
+    return {"id": snapshot.id, "taken_at": snapshot.taken_at}
+
+async def export_response(
+    name: str,
+    format: str,
+    background: bool,
+    current_user: Principal,
+    **filters,
+) -> Response:
+    """Stream an export, or with ``background`` write it to a file in a job."""
+    if background:
+        record = await enqueue(
+            export_job,
+            owner_id=current_user.id,
+            name=name,
+            format=format,
+            filters=jsonable_encoder(filters),
+        )
+        return JSONResponse(record, status_code=202)
+    
+    query = EXPORT_QUERIES[name](**filters)
+    filename = f"{name}-{datetime.utcnow():%Y%m%d%H%M%S}.{format}"
+    return StreamingResponse(
+        stream_export(query, format, settings.EXPORT_BATCH_SIZE),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.get("/levels/export")
+async def export_stock_levels(
+    format: Literal["csv", "ndjson"] = "csv",
+    product_id: Optional[UUID] = None,
+    location: Optional[str] = None,
+    updated_from: Optional[datetime] = None,
+    updated_to: Optional[datetime] = None,
+    background: bool = False,
+    current_user: Principal = Depends(get_current_active_user)
+) -> Response:
+    return await export_response(
+        "stock-levels",
+        format,
+        background,
+        current_user,
+        product_id=product_id,
+        location=location,
+        updated_from=updated_from,
+        updated_to=updated_to,
+    )
+
+@router.get("/movements/export")
+async def export_stock_movements(
+    format: Literal["csv", "ndjson"] = "csv",
+    product_id: Optional[UUID] = None,
+    location: Optional[str] = None,
+    movement_type: Optional[MovementType] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    background: bool = False,
+    current_user: Principal = Depends(get_current_active_user)
+) -> Response:
+    """Stream the full movement ledger, oldest first, for the given filters.
+
+    With ``background=true`` the file is written by a job instead and can be
+    downloaded from ``/jobs/{job_id}/download`` once it completes.
+    """
+    return await export_response(
+        "stock-movements",
+        format,
+        background,
+        current_user,
+        product_id=product_id,
+        location=location,
+        movement_type=movement_type,
+        created_from=created_from,
+        created_to=created_to,
+    )
 
 @router.get("/movements", response_model=List[StockMovementSchema])
 async def list_stock_movements(
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
     product_id: Optional[UUID] = None,
+    location: Optional[str] = None,
     movement_type: Optional[MovementType] = None,
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-) -> List[StockMovement]:
-    query = select(StockMovement)
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
+) -> Response:
+    query = list_select(StockMovement, StockMovementSchema)
     
     if product_id:
         query = query.where(StockMovement.product_id == product_id)
+    if location:
+        query = query.where(StockMovement.location == location)
     if movement_type:
         query = query.where(StockMovement.type == movement_type)
     
-    query = query.order_by(StockMovement.created_at.desc())
-    query = query.offset(skip).limit(limit)
+    query = paginate(query, StockMovement, limit, skip=skip, cursor=cursor)
     result = await db.execute(query)
-    return result.scalars().all()
+    movements = fetch_items(result)
+    return Response(
+        content=dump_list(stock_movement_list_adapter, movements),
+        media_type="application/json",
+        headers=next_cursor_headers(movements, limit),
+    )
 
 @router.post("/movements", response_model=StockMovementSchema)
 async def create_stock_movement(
-    movement_in: StockMovementBase,
+    movement_in: StockMovementCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ) -> StockMovement:
     if current_user.role == UserRole.VIEWER:
         raise HTTPException(
@@ -79,72 +271,325 @@ async def create_stock_movement(
             detail="Product not found"
         )
     
-    # Get or create stock level
-    stock_level = await db.execute(
-        select(StockLevel).where(
-            StockLevel.product_id == movement_in.product_id,
-            StockLevel.location == "main"  # Default location
+    try:
+        movement = await run_in_transaction(
+            db, lambda: apply_movement(db, **movement_in.model_dump())
+        )
+    except InsufficientStock:
+        raise HTTPException(
+            status_code=400,
+            detail="Not enough stock"
+        )
+    
+    await bump_collection_version(db, stock_levels_version)
+    await publish_stock_events(pop_stock_events(db))
+    return movement
+
+@router.post("/transfers", response_model=List[StockMovementSchema])
+async def create_stock_transfer(
+    transfer_in: StockTransferCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_active_user)
+) -> List[StockMovement]:
+    """Move stock from one location to another atomically.
+
+    Returns the two movements: the debit of the source, with a negative
+    quantity, and the credit of the destination.
+    """
+    if current_user.role == UserRole.VIEWER:
+        raise HTTPException(
+            status_code=403,
+            detail="Not enough permissions"
+        )
+    
+    if transfer_in.from_location == transfer_in.to_location:
+        raise HTTPException(
+            status_code=400,
+            detail="Source and destination must differ"
+        )
+    
+    product = await db.get(Product, transfer_in.product_id)
+    if not product:
+        raise HTTPException(
+            status_code=404,
+            detail="Product not found"
+        )
+    
+    try:
+        movements = await run_in_transaction(
+            db, lambda: transfer_stock(db, **transfer_in.model_dump())
+        )
+    except InsufficientStock:
+        raise HTTPException(
+            status_code=400,
+            detail="Not enough stock"
+        )
+    
+    await bump_collection_version(db, stock_levels_version)
+    await publish_stock_events(pop_stock_events(db))
+    return movements
+
+@router.get("/locations")
+async def list_location_totals(
+    location: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
+) -> List[dict]:
+    """Stock totals per location, or for one location.
+
+    Totals come from an index-only scan of the (location, product_id)
+    index; one location reads only its own entries.
+    """
+    query = select(
+        StockLevel.location,
+        func.count().label("products"),
+        func.coalesce(func.sum(StockLevel.quantity), 0).label("total_quantity"),
+    )
+    if location:
+        query = query.where(StockLevel.location == location)
+    
+    result = await db.execute(query.group_by(StockLevel.location).order_by(StockLevel.location))
+    return [
+        {
+            "location": row.location,
+            "products": row.products,
+            "total_quantity": int(row.total_quantity),
+        }
+        for row in result
+    ]
+
+@router.get("/stream")
+async def stream_stock_changes(
+    request: Request,
+    product_id: Optional[List[UUID]] = Query(None),
+    location: Optional[List[str]] = Query(None),
+    last_event_id: Optional[str] = Header(None),
+    current_user: Principal = Depends(get_current_active_user)
+) -> StreamingResponse:
+    """Server-sent events for stock changes, optionally for some products or locations.
+
+    Reconnect with the Last-Event-ID header to receive what was missed.
+    """
+    if last_event_id and not STREAM_ID.match(last_event_id):
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid Last-Event-ID"
         )
+    
+    return StreamingResponse(
+        stream_stock_events(
+            request,
+            product_ids=[str(id) for id in product_id] if product_id else None,
+            locations=location,
+            last_event_id=last_event_id,
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    stock_level = stock_level.scalar_one_or_none()
-    
-    if not stock_level:
-        stock_level = StockLevel(
-            product_id=movement_in.product_id,
-            quantity=0,
-            location="main"
-        )
-        db.add(stock_level)
-    
-    # Update stock level based on movement type
-    if movement_in.type == MovementType.IN:
-        stock_level.quantity += movement_in.quantity
-    elif movement_in.type == MovementType.OUT:
-        if stock_level.quantity < movement_in.quantity:
-            raise HTTPException(
-                status_code=400,
-                detail="Not enough stock"
-            )
-        stock_level.quantity -= movement_in.quantity
-    else:  # ADJUST
-        stock_level.quantity = movement_in.quantity
-    
-    # Create movement record
-    db_movement = StockMovement(**movement_in.model_dump())
-    db.add(db_movement)
+
+@router.post("/movements/batch", response_model=List[StockMovementBatchResult])
+async def create_stock_movement_batch(
+    batch_in: StockMovementBatch,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_active_user)
+) -> List[StockMovementBatchResult]:
+    """Apply movements for many products and locations in one transaction.
+
+    Each movement may carry an idempotency key; resending a key that was
+    already applied reports it as a duplicate instead of moving stock again.
+    """
+    if current_user.role == UserRole.VIEWER:
+        raise HTTPException(
+            status_code=403,
+            detail="Not enough permissions"
+        )
     
-    await db.commit()
-    await db.refresh(db_movement)
+    try:
+        results = await run_in_transaction(
+            db, lambda: apply_movement_batch(db, batch_in.movements)
+        )
+    except IntegrityError:
+        # A concurrent request recorded one of our idempotency keys first;
+        # rerunning reports those items as duplicates
+        results = await run_in_transaction(
+            db, lambda: apply_movement_batch(db, batch_in.movements)
+        )
     
-    return db_movement
+    await bump_collection_version(db, stock_levels_version)
+    await publish_stock_events(pop_stock_events(db))
+    return results
 
 @router.get("/alerts")
 async def get_stock_alerts(
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    category_id: Optional[UUID] = None,
+    include_descendants: bool = False,
+    location: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
 ) -> dict:
-    # Get products with stock below minimum level
-    query = select(
-        Product.id,
-        Product.name,
-        Product.min_stock,
-        func.coalesce(func.sum(StockLevel.quantity), 0).label("total_stock")
-    ).outerjoin(StockLevel).group_by(Product.id).having(
-        func.coalesce(func.sum(StockLevel.quantity), 0) <= Product.min_stock
-    )
+    """Low-stock products, most severe first.
+
+    With ``location`` a product is low when its stock at that location is
+    at or below its min_stock; otherwise its total across locations is.
+    """
+    if location:
+        # Read through the (location, product_id) index, so other
+        # locations' rows are never visited
+        min_stock = func.coalesce(Product.min_stock, 0)
+        severity = alert_severity(StockLevel.quantity, min_stock)
+        condition = and_(StockLevel.location == location, StockLevel.quantity <= min_stock)
+        query = select(
+            StockLevel.product_id,
+            Product.name,
+            min_stock.label("min_stock"),
+            StockLevel.quantity.label("total_stock"),
+            severity.label("severity"),
+        ).join(Product).where(condition)
+        count_query = select(func.count()).select_from(StockLevel).join(Product).where(condition)
+        order_by = (severity.desc(), (min_stock - StockLevel.quantity).desc(), StockLevel.product_id)
+    else:
+        # Summaries are maintained on every stock change, so this is an
+        # index scan over low-stock rows only
+        query = select(
+            ProductStockSummary.product_id,
+            Product.name,
+            ProductStockSummary.min_stock,
+            ProductStockSummary.total_stock,
+            ProductStockSummary.severity,
+        ).join(Product).where(
+            ProductStockSummary.is_low
+        )
+        count_query = select(func.count()).select_from(ProductStockSummary).where(ProductStockSummary.is_low)
+        order_by = (
+            ProductStockSummary.severity.desc(),
+            ProductStockSummary.shortfall.desc(),
+            ProductStockSummary.product_id,
+        )
+    if category_id:
+        condition = category_filter(Product.category_id, category_id, include_descendants)
+        query = query.where(condition)
+        if not location:
+            count_query = count_query.join(Product)
+        count_query = count_query.where(condition)
+    
+    query = query.order_by(*order_by).offset(skip).limit(limit)
     
     result = await db.execute(query)
     alerts = []
     
     for row in result:
         alerts.append({
-            "product_id": row.id,
+            "product_id": row.product_id,
             "product_name": row.name,
             "min_stock": row.min_stock,
             "current_stock": row.total_stock,
+            "severity": StockAlertSeverity(row.severity).name.lower(),
         })
     
+    count = await db.scalar(count_query)
+    
     return {
         "alerts": alerts,
-        "count": len(alerts)
-    }
\ No newline at end of file
+        "count": count
+    }
+
+@router.post("/alerts/recompute", status_code=202)
+async def recompute_stock_alerts(
+    current_user: Principal = Depends(get_current_active_user)
+) -> dict:
+    """Rebuild every stock summary from stock levels in a background job."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=403,
+            detail="Not enough permissions"
+        )
+    
+    return await enqueue(reconcile_alerts_job, owner_id=current_user.id)
+
+@router.get("/analytics")
+async def get_inventory_analytics(
+    start: date,
+    end: date,
+    bucket: Literal["day", "week", "month"] = "day",
+    category_id: Optional[UUID] = None,
+    product_id: Optional[UUID] = None,
+    location: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
+) -> dict:
+    """Movement quantities per period and type over [start, end), from daily rollups.
+
+    Per category by default, or for a single product when product_id is given.
+    ADJUST movements are counted but add no quantity: they record the level
+    they set rather than a change.
+    """
+    if end <= start:
+        raise HTTPException(
+            status_code=400,
+            detail="end must be after start"
+        )
+    
+    rollup = ProductMovementDaily if product_id else category_rollup().c
+    group = rollup.product_id if product_id else rollup.category_id
+    # Inline the (validated) unit so GROUP BY matches the selected expression
+    period = cast(func.date_trunc(literal_column(f"'{bucket}'"), rollup.day), Date).label("period")
+    
+    query = select(
+        period,
+        group.label("group_id"),
+        rollup.type,
+        func.sum(rollup.quantity).label("quantity"),
+        func.sum(rollup.movement_count).label("movements"),
+    ).where(
+        rollup.day >= start,
+        rollup.day < end,
+    )
+    
+    if product_id:
+        query = query.where(ProductMovementDaily.product_id == product_id)
+    if category_id and not product_id:
+        query = query.where(rollup.category_id == category_id)
+    if location:
+        query = query.where(rollup.location == location)
+    
+    query = query.group_by(period, group, rollup.type).order_by(period, group, rollup.type)
+    result = await db.execute(query)
+    
+    group_key = "product_id" if product_id else "category_id"
+    return {
+        "bucket": bucket,
+        "start": start,
+        "end": end,
+        "series": [
+            {
+                "period": row.period,
+                group_key: row.group_id,
+                "type": row.type.value,
+                "quantity": int(row.quantity),
+                "movements": int(row.movements),
+            }
+            for row in result
+        ],
+    }
+
+@router.post("/analytics/backfill", status_code=202)
+async def backfill_inventory_analytics(
+    start: date,
+    end: date,
+    current_user: Principal = Depends(get_current_active_user)
+) -> dict:
+    """Rebuild the daily rollups for [start, end) from the movement ledger."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=403,
+            detail="Not enough permissions"
+        )
+    
+    return await enqueue(
+        backfill_rollups_job,
+        owner_id=current_user.id,
+        start=start.isoformat(),
+        end=end.isoformat(),
+    )
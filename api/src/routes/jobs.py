@@ -0,0 +1,68 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from src.core.config import settings
+from src.core.jobs import Record, cancel, job_store
+from src.core.principals import Principal
+from src.models import UserRole
+from src.routes.auth import get_current_active_user
+from uuid import UUID
+
+router = APIRouter()
+
+async def load_job(job_id: UUID, current_user: Principal) -> Record:
+    """A job visible to the current user: their own, or any for admins."""
+    record = await job_store.load(str(job_id))
+    if not record or (
+        current_user.role != UserRole.ADMIN and record["owner_id"] != str(current_user.id)
+    ):
+        raise HTTPException(
+            status_code=404,
+            detail="Job not found"
+        )
+    return record
+
+@router.get("/{job_id}")
+async def get_job(
+    job_id: UUID,
+    current_user: Principal = Depends(get_current_active_user)
+) -> Record:
+    return await load_job(job_id, current_user)
+
+@router.post("/{job_id}/cancel", status_code=202)
+async def cancel_job(
+    job_id: UUID,
+    current_user: Principal = Depends(get_current_active_user)
+) -> Record:
+    """Request cancellation; a running job stops at its next progress report."""
+    record = await load_job(job_id, current_user)
+    if record["status"] in ("completed", "failed", "cancelled"):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job already {record['status']}"
+        )
+    await cancel(record["id"])
+    return record
+
+@router.get("/{job_id}/download")
+async def download_job_file(
+    job_id: UUID,
+    current_user: Principal = Depends(get_current_active_user)
+) -> FileResponse:
+    """The file a completed job wrote, such as a background export."""
+    record = await load_job(job_id, current_user)
+    result = record["result"] or {}
+    path = result.get("file") if record["status"] == "completed" else None
+    if not path or not os.path.isfile(path):
+        raise HTTPException(
+            status_code=404,
+            detail="Job has no file to download"
+        )
+    # Only serve files jobs wrote under the upload directory
+    root = os.path.realpath(settings.UPLOAD_DIR)
+    if os.path.commonpath([root, os.path.realpath(path)]) != root:
+        raise HTTPException(
+            status_code=404,
+            detail="Job has no file to download"
+        )
+    return FileResponse(path, filename=result.get("filename") or os.path.basename(path))
@@ -1,40 +1,92 @@
+import asyncio
+import io
+import json
+import os
+import shutil
+import tempfile
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, UploadFile, File
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.core.database import get_db
-from src.models import Product, Category, User, UserRole
+from src.core.config import settings
+from src.core.database import get_db, get_read_db
+from src.core.etag import bump_collection_version, etag_headers, make_etag
+from src.core.jobs import enqueue, job_store
+from src.core.pagination import next_cursor_headers, paginate
+from src.core.principals import Principal
+from src.core.response_cache import cached_response, json_body, response_cache
+from src.core.uploads import MULTIPART_OVERHEAD, InvalidUpload, declared_length, multipart_file
+from src.core.serialization import dump_list, fetch_items, list_select
+from src.models import Product, Category, UserRole, stock_levels_version
 from src.schemas import ProductCreate, ProductUpdate, Product as ProductSchema
 from src.routes.auth import get_current_active_user
+from src.services.product_import import ImportJob, run_import
+from src.services.category_tree import category_filter
+from src.services.product_attributes import (
+    attribute_filters,
+    attributes_condition,
+    facet_counts,
+    index_products,
+    unindex_products,
+)
+from src.services.image_storage import ImageTooLarge, InvalidImage, store_upload
+from src.services.product_search import ranked_search, search_condition
+from src.services.stock_alerts import refresh_stock_summaries
+from src.tasks import import_products_job, rebuild_facets_job
 from uuid import UUID
 
 router = APIRouter()
 
+product_adapter = TypeAdapter(ProductSchema)
+product_list_adapter = TypeAdapter(List[ProductSchema])
+
 @router.get("/", response_model=List[ProductSchema])
 async def list_products(
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
     category_id: Optional[UUID] = None,
+    include_descendants: bool = False,
     search: Optional[str] = None,
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-) -> List[Product]:
-    query = select(Product)
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
+) -> Response:
+    """List products; filter on attributes with ``attr.<name>=<value>``.
+
+    Repeating a name matches any of its values, e.g.
+    ``attr.size=M&attr.size=L&attr.color=black``.
+    """
+    filters = attribute_filters(request)
     
-    if category_id:
-        query = query.where(Product.category_id == category_id)
-    if search:
-        query = query.where(Product.name.ilike(f"%{search}%"))
+    async def load() -> dict:
+        query = list_select(Product, ProductSchema)
+        
+        if category_id:
+            query = query.where(category_filter(Product.category_id, category_id, include_descendants))
+        if filters:
+            query = query.where(attributes_condition(filters))
+        if search:
+            query = query.where(search_condition(search))
+        
+        query = paginate(query, Product, limit, skip=skip, cursor=cursor)
+        result = await db.execute(query)
+        products = fetch_items(result)
+        body = dump_list(product_list_adapter, products).decode()
+        return {
+            "body": body,
+            "headers": {**next_cursor_headers(products, limit), **etag_headers(make_etag(body))},
+        }
     
-    query = query.offset(skip).limit(limit)
-    result = await db.execute(query)
-    return result.scalars().all()
+    return await cached_response(request, ["products"], load)
 
 @router.post("/", response_model=ProductSchema)
 async def create_product(
     product_in: ProductCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ) -> Product:
     if current_user.role == UserRole.VIEWER:
         raise HTTPException(
@@ -63,30 +115,142 @@ async def create_product(
     # Create product
     db_product = Product(**product_in.model_dump())
     db.add(db_product)
+    await db.flush()
+    await refresh_stock_summaries(db, [db_product.id])
+    await index_products(db, [db_product.id])
     await db.commit()
     await db.refresh(db_product)
+    await response_cache.invalidate("products")
     return db_product
 
-@router.get("/{product_id}", response_model=ProductSchema)
-async def get_product(
-    product_id: UUID,
+@router.get("/search", response_model=List[ProductSchema])
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
+) -> List[Product]:
+    """Typo-tolerant search over name, SKU, barcode and description."""
+    result = await db.execute(ranked_search(q, limit))
+    return result.scalars().all()
+
+@router.post("/import")
+async def import_products(
+    response: Response,
+    file: UploadFile = File(...),
+    background: bool = False,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-) -> Product:
-    product = await db.get(Product, product_id)
-    if not product:
+    current_user: Principal = Depends(get_current_active_user)
+) -> dict:
+    """Create or update products from a CSV file, upserting by SKU.
+
+    Columns follow ProductCreate; ``category`` may be a category name or id.
+    With ``background=true`` the import runs as a job and its progress can
+    be polled at ``/jobs/{job_id}``.
+    """
+    if current_user.role == UserRole.VIEWER:
+        raise HTTPException(
+            status_code=403,
+            detail="Not enough permissions"
+        )
+    
+    if background:
+        # The upload is closed once the request ends, so keep our own copy
+        os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=settings.UPLOAD_DIR, suffix=".csv", delete=False) as spool:
+            await asyncio.to_thread(shutil.copyfileobj, file.file, spool)
+        response.status_code = 202
+        return await enqueue(import_products_job, owner_id=current_user.id, path=spool.name)
+    
+    job = ImportJob()
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        await run_import(db, job, stream, settings.IMPORT_BATCH_SIZE)
+    finally:
+        await response_cache.invalidate(*job.cache_tags())
+        await bump_collection_version(db, stock_levels_version)
+    if job.status == "failed":
+        raise HTTPException(
+            status_code=400,
+            detail=jsonable_encoder(job.report())
+        )
+    return job.report()
+
+@router.get("/import/{job_id}")
+async def get_import_job(
+    job_id: UUID,
+    current_user: Principal = Depends(get_current_active_user)
+) -> dict:
+    """Progress of a background import; the same record as ``/jobs/{job_id}``."""
+    record = await job_store.load(str(job_id))
+    if not record or record["name"] != import_products_job.name:
         raise HTTPException(
             status_code=404,
-            detail="Product not found"
+            detail="Import job not found"
         )
-    return product
+    return record
+
+@router.get("/facets")
+async def get_product_facets(
+    request: Request,
+    category_id: Optional[UUID] = None,
+    include_descendants: bool = False,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
+) -> Response:
+    """Product counts per attribute value, for the same ``attr.*`` filters as listing.
+
+    Returns ``{attribute: {value: count}}``, most common values first.
+    """
+    filters = attribute_filters(request)
+    
+    async def load() -> dict:
+        facets = await facet_counts(db, category_id, include_descendants, filters)
+        body = json.dumps(facets)
+        return {"body": body, "headers": etag_headers(make_etag(body))}
+    
+    return await cached_response(request, ["products"], load)
+
+@router.post("/facets/rebuild", status_code=202)
+async def rebuild_product_facets(
+    current_user: Principal = Depends(get_current_active_user)
+) -> dict:
+    """Rebuild the attribute index and facet counts from products in a job."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=403,
+            detail="Not enough permissions"
+        )
+    
+    return await enqueue(rebuild_facets_job, owner_id=current_user.id)
+
+@router.get("/{product_id}", response_model=ProductSchema)
+async def get_product(
+    product_id: UUID,
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
+) -> Response:
+    async def load() -> dict:
+        product = await db.get(Product, product_id)
+        if not product:
+            raise HTTPException(
+                status_code=404,
+                detail="Product not found"
+            )
+        return {
+            "body": json_body(product_adapter, product),
+            "headers": etag_headers(make_etag(product.id, product.updated_at.isoformat())),
+        }
+    
+    return await cached_response(request, [f"product:{product_id}"], load)
 
 @router.put("/{product_id}", response_model=ProductSchema)
 async def update_product(
     product_id: UUID,
     product_in: ProductUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ) -> Product:
     if current_user.role == UserRole.VIEWER:
         raise HTTPException(
@@ -112,19 +276,32 @@ async def update_product(
                 detail="Category not found"
             )
     
+    previous_category_id = product.category_id
+    
     # Update product attributes
     for field, value in update_data.items():
         setattr(product, field, value)
     
+    if "min_stock" in update_data:
+        await db.flush()
+        await refresh_stock_summaries(db, [product.id])
+    if "attributes" in update_data or "category_id" in update_data:
+        await db.flush()
+        await index_products(db, [product.id], {product.id: previous_category_id})
+    
     await db.commit()
     await db.refresh(product)
+    await response_cache.invalidate("products", f"product:{product_id}")
+    if "min_stock" in update_data:
+        # Low-stock filtering of stock levels depends on min_stock
+        await bump_collection_version(db, stock_levels_version)
     return product
 
 @router.delete("/{product_id}")
 async def delete_product(
     product_id: UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ) -> dict:
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(
@@ -139,24 +316,78 @@ async def delete_product(
             detail="Product not found"
         )
     
+    await unindex_products(db, [product.id])
     await db.delete(product)
     await db.commit()
+    await response_cache.invalidate("products", f"product:{product_id}")
     
     return {"message": "Product deleted successfully"}
 
-@router.post("/{product_id}/image")
+@router.post(
+    "/{product_id}/image",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {"file": {"type": "string", "format": "binary"}},
+                        "required": ["file"],
+                    }
+                }
+            },
+        }
+    },
+)
 async def upload_product_image(
     product_id: UUID,
-    file: UploadFile = File(...),
+    request: Request,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ) -> dict:
+    """Upload a product image as the multipart field ``file``.
+
+    The body is read here rather than by a ``File()`` parameter, which
+    would spool all of it before the handler runs; an oversized image is
+    refused from its Content-Length or as soon as it passes the limit.
+    """
     if current_user.role == UserRole.VIEWER:
         raise HTTPException(
             status_code=403,
             detail="Not enough permissions"
         )
     
+    length = declared_length(request)
+    if length is not None and length > settings.MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image exceeds {settings.MAX_UPLOAD_SIZE} bytes"
+        )
+    
+    exists = await db.scalar(select(Product.id).where(Product.id == product_id))
+    # Hand the connection back to the pool while the body streams in; a
+    # slow client would otherwise hold it for the whole upload
+    await db.commit()
+    if not exists:
+        raise HTTPException(
+            status_code=404,
+            detail="Product not found"
+        )
+    
+    try:
+        stored = await store_upload(multipart_file(request, "file"))
+    except ImageTooLarge:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image exceeds {settings.MAX_UPLOAD_SIZE} bytes"
+        )
+    except (InvalidImage, InvalidUpload) as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+    
     product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(
@@ -164,6 +395,13 @@ async def upload_product_image(
             detail="Product not found"
         )
     
-    # TODO: Implement file upload to storage service
-    # For now, just return success
-    return {"message": "Image uploaded successfully"}
\ No newline at end of file
+    product.image_url = f"{settings.API_V1_STR}/images/{stored.name}"
+    await db.commit()
+    await response_cache.invalidate("products", f"product:{product_id}")
+    
+    return {
+        "message": "Image uploaded successfully",
+        "image_url": product.image_url,
+        "size": stored.size,
+        "deduplicated": not stored.created,
+    }
\ No newline at end of file
@@ -1,44 +1,78 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse
+from pydantic import TypeAdapter
+from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.core.database import get_db
+from src.core.database import get_db, get_read_db
+from src.core.etag import bump_collection_version, etag_headers, make_etag
+from src.core.jobs import enqueue
+from src.core.pagination import next_cursor_headers, paginate, set_next_cursor
+from src.core.principals import Principal
+from src.core.response_cache import cached_response, json_body, response_cache
+from src.core.serialization import dump_list, fetch_items, list_select
 from src.models import (
     Supplier,
     PurchaseOrder,
     PurchaseOrderItem,
-    StockMovement,
-    MovementType,
-    User,
     UserRole,
+    stock_levels_version,
 )
 from src.schemas import (
     SupplierCreate,
     Supplier as SupplierSchema,
     PurchaseOrderCreate,
     PurchaseOrder as PurchaseOrderSchema,
+    ReplenishmentPlan,
 )
+from src.repositories import purchase_orders
 from src.routes.auth import get_current_active_user
+from src.services.po_documents import get_order_document
+from src.services.purchase_orders import (
+    OrderTooLarge,
+    UnpricedLines,
+    UnknownReferences,
+    create_orders,
+    draft_from_request,
+    drafts_from_plan,
+)
+from src.services.stock_events import publish_stock_events
+from src.services.stock_ledger import pop_stock_events, receive_stock
+from src.tasks import render_supplier_documents_job, suggest_reorders_job
 from uuid import UUID
 
 router = APIRouter()
 
+supplier_adapter = TypeAdapter(SupplierSchema)
+supplier_list_adapter = TypeAdapter(List[SupplierSchema])
+
 @router.get("/", response_model=List[SupplierSchema])
 async def list_suppliers(
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-) -> List[Supplier]:
-    query = select(Supplier).offset(skip).limit(limit)
-    result = await db.execute(query)
-    return result.scalars().all()
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
+) -> Response:
+    async def load() -> dict:
+        query = list_select(Supplier, SupplierSchema)
+        query = paginate(query, Supplier, limit, skip=skip, cursor=cursor)
+        result = await db.execute(query)
+        suppliers = fetch_items(result)
+        body = dump_list(supplier_list_adapter, suppliers).decode()
+        return {
+            "body": body,
+            "headers": {**next_cursor_headers(suppliers, limit), **etag_headers(make_etag(body))},
+        }
+    
+    return await cached_response(request, ["suppliers"], load)
 
 @router.post("/", response_model=SupplierSchema)
 async def create_supplier(
     supplier_in: SupplierCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ) -> Supplier:
     if current_user.role == UserRole.VIEWER:
         raise HTTPException(
@@ -50,44 +84,106 @@ async def create_supplier(
     db.add(db_supplier)
     await db.commit()
     await db.refresh(db_supplier)
+    await response_cache.invalidate("suppliers")
     return db_supplier
 
 @router.get("/{supplier_id}", response_model=SupplierSchema)
 async def get_supplier(
     supplier_id: UUID,
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-) -> Supplier:
-    supplier = await db.get(Supplier, supplier_id)
-    if not supplier:
-        raise HTTPException(
-            status_code=404,
-            detail="Supplier not found"
-        )
-    return supplier
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
+) -> Response:
+    async def load() -> dict:
+        supplier = await db.get(Supplier, supplier_id)
+        if not supplier:
+            raise HTTPException(
+                status_code=404,
+                detail="Supplier not found"
+            )
+        return {
+            "body": json_body(supplier_adapter, supplier),
+            "headers": etag_headers(make_etag(supplier.id, supplier.updated_at.isoformat())),
+        }
+    
+    return await cached_response(request, [f"supplier:{supplier_id}"], load)
 
 @router.get("/{supplier_id}/orders", response_model=List[PurchaseOrderSchema])
 async def list_supplier_orders(
     supplier_id: UUID,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
 ) -> List[PurchaseOrder]:
-    query = select(PurchaseOrder).where(
-        PurchaseOrder.supplier_id == supplier_id
-    ).order_by(
-        PurchaseOrder.created_at.desc()
-    ).offset(skip).limit(limit)
-    
-    result = await db.execute(query)
-    return result.scalars().all()
+    orders = await purchase_orders.list_supplier_orders(
+        db, supplier_id, limit, skip=skip, cursor=cursor
+    )
+    set_next_cursor(response, orders, limit)
+    return orders
+
+@router.post("/{supplier_id}/orders/documents", status_code=202)
+async def render_supplier_order_documents(
+    supplier_id: UUID,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
+) -> dict:
+    """Render PDFs for all of a supplier's orders in a background job.
+
+    The job result is a zip of every document, downloadable from
+    ``/jobs/{job_id}/download``; the individual PDFs are cached as well.
+    """
+    if current_user.role == UserRole.VIEWER:
+        raise HTTPException(
+            status_code=403,
+            detail="Not enough permissions"
+        )
+    
+    supplier = await db.get(Supplier, supplier_id)
+    if not supplier:
+        raise HTTPException(
+            status_code=404,
+            detail="Supplier not found"
+        )
+    
+    return await enqueue(
+        render_supplier_documents_job,
+        owner_id=current_user.id,
+        supplier_id=str(supplier_id),
+    )
+
+@router.get("/orders/{order_id}/document")
+async def get_purchase_order_document(
+    order_id: UUID,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
+) -> FileResponse:
+    """The order as a PDF; rendered once per version of the order, then served from disk."""
+    if current_user.role == UserRole.VIEWER:
+        raise HTTPException(
+            status_code=403,
+            detail="Not enough permissions"
+        )
+    
+    path = await get_order_document(db, order_id)
+    if not path:
+        raise HTTPException(
+            status_code=404,
+            detail="Order not found"
+        )
+    return FileResponse(
+        path,
+        media_type="application/pdf",
+        filename=f"purchase-order-{order_id}.pdf",
+    )
 
 @router.post("/orders", response_model=PurchaseOrderSchema)
 async def create_purchase_order(
     order_in: PurchaseOrderCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ) -> PurchaseOrder:
     if current_user.role == UserRole.VIEWER:
         raise HTTPException(
@@ -95,43 +191,81 @@ async def create_purchase_order(
             detail="Not enough permissions"
         )
     
-    # Check if supplier exists
-    supplier = await db.get(Supplier, order_in.supplier_id)
-    if not supplier:
+    if not order_in.items:
         raise HTTPException(
-            status_code=404,
-            detail="Supplier not found"
+            status_code=400,
+            detail="Order has no items"
         )
     
-    # Calculate total amount
-    total_amount = sum(item.quantity * item.unit_price for item in order_in.items)
+    # Items go in with one multi-row insert however long the order is
+    try:
+        [order_id] = await create_orders(db, [draft_from_request(order_in)])
+    except UnknownReferences as e:
+        raise HTTPException(
+            status_code=404 if e.kind == "suppliers" else 400,
+            detail="Supplier not found" if e.kind == "suppliers" else str(e)
+        )
+    except (OrderTooLarge, UnpricedLines) as e:
+        raise HTTPException(
+            status_code=422,
+            detail=str(e)
+        )
     
-    # Create purchase order
-    db_order = PurchaseOrder(
-        supplier_id=order_in.supplier_id,
-        status="draft",
-        total_amount=total_amount,
-        notes=order_in.notes
-    )
-    db.add(db_order)
+    await db.commit()
+    return await purchase_orders.get_order(db, order_id)
+
+@router.post("/orders/plan", response_model=List[PurchaseOrderSchema])
+async def create_purchase_orders_from_plan(
+    plan_in: ReplenishmentPlan,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_active_user)
+) -> List[PurchaseOrder]:
+    """Create one draft order per supplier from a replenishment plan, atomically."""
+    if current_user.role == UserRole.VIEWER:
+        raise HTTPException(
+            status_code=403,
+            detail="Not enough permissions"
+        )
     
-    # Create purchase order items
-    for item in order_in.items:
-        db_item = PurchaseOrderItem(
-            po_id=db_order.id,
-            **item.model_dump()
+    try:
+        drafts = await drafts_from_plan(db, plan_in.lines, plan_in.notes)
+        order_ids = await create_orders(db, drafts)
+    except UnknownReferences as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+    except (OrderTooLarge, UnpricedLines) as e:
+        raise HTTPException(
+            status_code=422,
+            detail=str(e)
         )
-        db.add(db_item)
     
     await db.commit()
-    await db.refresh(db_order)
-    return db_order
+    return await purchase_orders.get_orders(db, order_ids)
+
+@router.post("/orders/suggestions", status_code=202)
+async def suggest_purchase_orders(
+    dry_run: bool = False,
+    current_user: Principal = Depends(get_current_active_user)
+) -> dict:
+    """Compute reorder suggestions from sales history in a background job.
+
+    Unless ``dry_run``, the suggestions become draft orders, one per supplier.
+    """
+    if current_user.role == UserRole.VIEWER:
+        raise HTTPException(
+            status_code=403,
+            detail="Not enough permissions"
+        )
+    
+    return await enqueue(suggest_reorders_job, owner_id=current_user.id, dry_run=dry_run)
 
 @router.post("/orders/{order_id}/receive")
 async def receive_purchase_order(
     order_id: UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ) -> dict:
     if current_user.role == UserRole.VIEWER:
         raise HTTPException(
@@ -139,7 +273,8 @@ async def receive_purchase_order(
             detail="Not enough permissions"
         )
     
-    order = await db.get(PurchaseOrder, order_id)
+    # Lock the order so two receipts cannot both book its stock
+    order = await purchase_orders.get_order(db, order_id, for_update=True)
     if not order:
         raise HTTPException(
             status_code=404,
@@ -155,18 +290,22 @@ async def receive_purchase_order(
     # Update order status
     order.status = "received"
     
-    # Create stock movements for each item
-    for item in order.items:
-        movement = StockMovement(
-            product_id=item.product_id,
-            type=MovementType.IN,
-            quantity=item.quantity,
-            reference_id=order.id,
-            notes=f"Received from PO #{order.id}"
-        )
-        db.add(movement)
-        item.received_quantity = item.quantity
+    # Book all lines at once: one movement insert, one level upsert and one
+    # item update, however many lines the order has
+    await receive_stock(
+        db,
+        [(item.product_id, item.quantity) for item in order.items],
+        reference_id=order.id,
+        notes=f"Received from PO #{order.id}",
+    )
+    await db.execute(
+        update(PurchaseOrderItem)
+        .where(PurchaseOrderItem.po_id == order.id)
+        .values(received_quantity=PurchaseOrderItem.quantity)
+    )
     
     await db.commit()
+    await bump_collection_version(db, stock_levels_version)
+    await publish_stock_events(pop_stock_events(db))
     
-    return {"message": "Purchase order received successfully"}
\ No newline at end of file
+    return {"message": "Purchase order received successfully"}
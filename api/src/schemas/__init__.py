@@ -1,5 +1,6 @@
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime
+from decimal import Decimal
 from uuid import UUID
 from pydantic import BaseModel, EmailStr, Field, constr
 
@@ -77,6 +78,11 @@ class CategoryBase(BaseModel):
 class CategoryCreate(CategoryBase):
     pass
 
+class CategoryUpdate(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    parent_id: Optional[UUID] = None
+
 class Category(CategoryBase):
     id: UUID
     created_at: datetime
@@ -85,6 +91,12 @@ class Category(CategoryBase):
     class Config:
         from_attributes = True
 
+class CategoryTreeNode(BaseModel):
+    id: UUID
+    name: str
+    description: Optional[str] = None
+    children: List["CategoryTreeNode"] = []
+
 class StockLevelBase(BaseModel):
     product_id: UUID
     quantity: int = Field(ge=0)
@@ -98,13 +110,24 @@ class StockLevel(StockLevelBase):
     class Config:
         from_attributes = True
 
-class StockMovementBase(BaseModel):
+class StockLevelAsOf(BaseModel):
     product_id: UUID
-    type: str  # in, out, adjust
+    location: str
     quantity: int
+
+class StockMovementBase(BaseModel):
+    product_id: UUID
+    type: str  # in, out, adjust, transfer
+    quantity: int  # Negative on the source side of a transfer
+    location: str = "main"
     reference_id: Optional[UUID] = None
     notes: Optional[str] = None
 
+class StockMovementCreate(StockMovementBase):
+    # Transfers go through StockTransferCreate
+    type: Literal["in", "out", "adjust"]
+    quantity: int = Field(ge=0)  # ADJUST may set a level to zero
+
 class StockMovement(StockMovementBase):
     id: UUID
     created_at: datetime
@@ -113,6 +136,29 @@ class StockMovement(StockMovementBase):
     class Config:
         from_attributes = True
 
+class StockMovementBatchItem(StockMovementBase):
+    # type stays free-form so one bad item is rejected alone, not the batch
+    quantity: int = Field(ge=0)
+    idempotency_key: Optional[str] = Field(None, max_length=200)
+
+class StockTransferCreate(BaseModel):
+    product_id: UUID
+    quantity: int = Field(gt=0)
+    from_location: str
+    to_location: str
+    reference_id: Optional[UUID] = None
+    notes: Optional[str] = None
+
+class StockMovementBatch(BaseModel):
+    movements: List[StockMovementBatchItem] = Field(min_length=1, max_length=1000)
+
+class StockMovementBatchResult(BaseModel):
+    index: int
+    status: str  # applied, duplicate, rejected
+    movement_id: Optional[UUID] = None
+    quantity: Optional[int] = None  # Stock level after the movement
+    detail: Optional[str] = None
+
 class SupplierBase(BaseModel):
     name: str
     contact_name: Optional[str] = None
@@ -134,8 +180,8 @@ class Supplier(SupplierBase):
 
 class PurchaseOrderItemBase(BaseModel):
     product_id: UUID
-    quantity: int = Field(gt=0)
-    unit_price: float = Field(gt=0)
+    quantity: int = Field(gt=0, le=2_147_483_647)  # INTEGER column
+    unit_price: Decimal = Field(gt=0, max_digits=10, decimal_places=2)
 
 class PurchaseOrderItem(PurchaseOrderItemBase):
     id: UUID
@@ -157,10 +203,21 @@ class PurchaseOrderCreate(PurchaseOrderBase):
 class PurchaseOrder(PurchaseOrderBase):
     id: UUID
     status: str
-    total_amount: float
+    total_amount: Decimal
     items: List[PurchaseOrderItem]
     created_at: datetime
     updated_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class ReplenishmentLine(BaseModel):
+    supplier_id: UUID
+    product_id: UUID
+    quantity: int = Field(gt=0, le=2_147_483_647)  # INTEGER column
+    # Defaults to the product's cost price
+    unit_price: Optional[Decimal] = Field(None, gt=0, max_digits=10, decimal_places=2)
+
+class ReplenishmentPlan(BaseModel):
+    lines: List[ReplenishmentLine] = Field(min_length=1, max_length=20_000)
+    notes: Optional[str] = None
@@ -0,0 +1,127 @@
+from typing import List, Optional
+from uuid import UUID
+from sqlalchemy import Select, delete, func, insert, literal, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.core.database import async_session
+from src.models import Category, CategoryClosure
+
+# Arbitrary pg_advisory_xact_lock key serializing changes to the hierarchy
+CATEGORY_TREE_LOCK = 720_021
+
+def descendant_ids(category_id: UUID) -> Select:
+    """The category and everything below it; one primary-key range scan."""
+    return select(CategoryClosure.descendant_id).where(CategoryClosure.ancestor_id == category_id)
+
+def category_filter(column, category_id: UUID, include_descendants: bool):
+    """Condition on a category id column, optionally covering the whole subtree."""
+    if include_descendants:
+        return column.in_(descendant_ids(category_id))
+    return column == category_id
+
+async def lock_hierarchy(db: AsyncSession) -> None:
+    """Serialize hierarchy changes until the transaction ends.
+
+    Row locks on the moved categories are not enough: two moves can each
+    pass the cycle check against the other's old parent, and closure rows
+    are derived from ancestors that another transaction may be moving.
+    """
+    await db.execute(select(func.pg_advisory_xact_lock(CATEGORY_TREE_LOCK)))
+
+async def add_to_closure(db: AsyncSession, category_id: UUID, parent_id: Optional[UUID]) -> None:
+    """Index a new leaf: a self row plus one row per ancestor of its parent."""
+    await db.execute(insert(CategoryClosure).values(
+        ancestor_id=category_id, descendant_id=category_id, depth=0
+    ))
+    if parent_id:
+        await db.execute(insert(CategoryClosure).from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(
+                CategoryClosure.ancestor_id,
+                literal(category_id),
+                CategoryClosure.depth + 1,
+            ).where(CategoryClosure.descendant_id == parent_id),
+        ))
+
+async def is_descendant(db: AsyncSession, category_id: UUID, ancestor_id: UUID) -> bool:
+    return await db.scalar(
+        select(func.count()).select_from(CategoryClosure).where(
+            CategoryClosure.ancestor_id == ancestor_id,
+            CategoryClosure.descendant_id == category_id,
+        )
+    ) > 0
+
+async def move_in_closure(db: AsyncSession, category_id: UUID, parent_id: Optional[UUID]) -> None:
+    """Re-hang a subtree under ``parent_id`` (the root when None) in two statements.
+
+    Links from the old ancestors into the subtree are dropped, then every
+    new ancestor is linked to every node of the subtree. Links inside the
+    subtree are unchanged.
+    """
+    subtree = descendant_ids(category_id)
+    old_ancestors = select(CategoryClosure.ancestor_id).where(
+        CategoryClosure.descendant_id == category_id,
+        CategoryClosure.ancestor_id != category_id,
+    )
+    await db.execute(
+        delete(CategoryClosure).where(
+            CategoryClosure.descendant_id.in_(subtree),
+            CategoryClosure.ancestor_id.in_(old_ancestors),
+        )
+    )
+    if parent_id:
+        above = select(CategoryClosure).where(CategoryClosure.descendant_id == parent_id).subquery()
+        below = select(CategoryClosure).where(CategoryClosure.ancestor_id == category_id).subquery()
+        await db.execute(insert(CategoryClosure).from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(
+                above.c.ancestor_id,
+                below.c.descendant_id,
+                above.c.depth + below.c.depth + 1,
+            ).select_from(above.join(below, true())),
+        ))
+
+async def rebuild_closure(db: AsyncSession) -> None:
+    """Rebuild the whole index from parent_id with one recursive query."""
+    await db.execute(delete(CategoryClosure))
+    tree = select(
+        Category.id.label("ancestor_id"),
+        Category.id.label("descendant_id"),
+        literal(0).label("depth"),
+    ).cte("tree", recursive=True)
+    tree = tree.union_all(
+        select(tree.c.ancestor_id, Category.id, tree.c.depth + 1)
+        .select_from(tree.join(Category, Category.parent_id == tree.c.descendant_id))
+    )
+    await db.execute(insert(CategoryClosure).from_select(
+        ["ancestor_id", "descendant_id", "depth"],
+        select(tree.c.ancestor_id, tree.c.descendant_id, tree.c.depth),
+    ))
+
+async def ensure_closure() -> None:
+    """Build the index once for categories created before it existed."""
+    async with async_session() as session:
+        # Workers start together; the first rebuilds, the rest find it done
+        await lock_hierarchy(session)
+        categories = await session.scalar(select(func.count()).select_from(Category))
+        indexed = await session.scalar(
+            select(func.count()).select_from(CategoryClosure).where(CategoryClosure.depth == 0)
+        )
+        if categories != indexed:
+            await rebuild_closure(session)
+            await session.commit()
+
+async def category_tree(db: AsyncSession) -> List[dict]:
+    """All categories as nested dicts, from one query."""
+    result = await db.execute(
+        select(Category.id, Category.name, Category.description, Category.parent_id)
+        .order_by(Category.name)
+    )
+    nodes = {}
+    rows = result.all()
+    for row in rows:
+        nodes[row.id] = {"id": row.id, "name": row.name, "description": row.description, "children": []}
+    roots = []
+    for row in rows:
+        parent = nodes.get(row.parent_id)
+        (parent["children"] if parent else roots).append(nodes[row.id])
+    return roots
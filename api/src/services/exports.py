@@ -0,0 +1,137 @@
+import csv
+import enum
+import io
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional
+from uuid import UUID
+import orjson
+from sqlalchemy import Select, select
+from src.core.database import async_session, naive_utc
+from src.models import MovementType, Product, StockLevel, StockMovement
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def _csv_chunk(rows: List[Any], header: Optional[List[str]] = None) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(header)
+    writer.writerows([_csv_value(value) for value in row] for row in rows)
+    return buffer.getvalue().encode()
+
+def _ndjson_chunk(rows: List[Any]) -> bytes:
+    return b"".join(orjson.dumps(row._asdict(), default=str) + b"\n" for row in rows)
+
+async def stream_export(query: Select, format: str, batch_size: int) -> AsyncIterator[bytes]:
+    """Stream a column query as CSV or NDJSON through a server-side cursor.
+
+    Rows are fetched ``batch_size`` at a time and each batch is encoded and
+    sent before the next is read, so memory use does not grow with the
+    number of rows. The export runs in its own session because server-side
+    cursors need a transaction and outlive the request handler.
+    """
+    async with async_session() as session:
+        result = await session.stream(query.execution_options(yield_per=batch_size))
+        if format == "csv":
+            yield _csv_chunk([], header=list(result.keys()))
+        async for rows in result.partitions():
+            yield _csv_chunk(rows) if format == "csv" else _ndjson_chunk(rows)
+
+async def write_export(
+    query: Select,
+    format: str,
+    path: str,
+    batch_size: int,
+    progress: Optional[Callable[[int], Awaitable[None]]] = None,
+) -> int:
+    """Write an export to ``path``; returns the number of rows written."""
+    rows = 0
+    async with async_session() as session:
+        result = await session.stream(query.execution_options(yield_per=batch_size))
+        with open(path, "wb") as file:
+            if format == "csv":
+                file.write(_csv_chunk([], header=list(result.keys())))
+            async for partition in result.partitions():
+                file.write(_csv_chunk(partition) if format == "csv" else _ndjson_chunk(partition))
+                rows += len(partition)
+                if progress:
+                    await progress(rows)
+    return rows
+
+def stock_levels_export_query(
+    product_id: Optional[UUID] = None,
+    location: Optional[str] = None,
+    updated_from: Optional[datetime] = None,
+    updated_to: Optional[datetime] = None,
+) -> Select:
+    query = select(
+        StockLevel.id,
+        StockLevel.product_id,
+        Product.sku,
+        StockLevel.location,
+        StockLevel.quantity,
+        StockLevel.updated_at,
+    ).join(Product)
+    # Timestamp columns are naive UTC; asyncpg rejects comparing them to aware values
+    updated_from, updated_to = naive_utc(updated_from), naive_utc(updated_to)
+    
+    if product_id:
+        query = query.where(StockLevel.product_id == product_id)
+    if location:
+        query = query.where(StockLevel.location == location)
+    if updated_from:
+        query = query.where(StockLevel.updated_at >= updated_from)
+    if updated_to:
+        query = query.where(StockLevel.updated_at < updated_to)
+    
+    return query.order_by(StockLevel.created_at, StockLevel.id)
+
+def stock_movements_export_query(
+    product_id: Optional[UUID] = None,
+    location: Optional[str] = None,
+    movement_type: Optional[MovementType] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+) -> Select:
+    """The full movement ledger, oldest first, for the given filters."""
+    query = select(
+        StockMovement.id,
+        StockMovement.created_at,
+        StockMovement.product_id,
+        Product.sku,
+        StockMovement.location,
+        StockMovement.type,
+        StockMovement.quantity,
+        StockMovement.reference_id,
+        StockMovement.notes,
+    ).join(Product)
+    created_from, created_to = naive_utc(created_from), naive_utc(created_to)
+    
+    if product_id:
+        query = query.where(StockMovement.product_id == product_id)
+    if location:
+        query = query.where(StockMovement.location == location)
+    if movement_type:
+        query = query.where(StockMovement.type == movement_type)
+    if created_from:
+        query = query.where(StockMovement.created_at >= created_from)
+    if created_to:
+        query = query.where(StockMovement.created_at < created_to)
+    
+    return query.order_by(StockMovement.created_at, StockMovement.id)
+
+# Export name -> query builder, for exports run as jobs
+EXPORT_QUERIES = {
+    "stock-levels": stock_levels_export_query,
+    "stock-movements": stock_movements_export_query,
+}
@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+from typing import AsyncIterable, List, Optional
+from src.core.config import settings
+from src.core.process_pool import ProcessPool
+
+IMAGE_DIR = os.path.join(settings.UPLOAD_DIR, "images")
+
+# Pillow format name -> stored file extension and media type
+IMAGE_FORMATS = {
+    "JPEG": ("jpg", "image/jpeg"),
+    "PNG": ("png", "image/png"),
+    "WEBP": ("webp", "image/webp"),
+    "GIF": ("gif", "image/gif"),
+}
+MEDIA_TYPES = dict(IMAGE_FORMATS.values())
+
+# Stored names are a sha256 digest and one of the extensions above
+IMAGE_NAME = re.compile(r"^[0-9a-f]{64}\.(jpg|png|webp|gif)$")
+
+image_pool = ProcessPool(max_workers=settings.IMAGE_WORKERS)
+
+class ImageTooLarge(Exception):
+    pass
+
+class InvalidImage(Exception):
+    pass
+
+@dataclass
+class StoredImage:
+    digest: str
+    extension: str
+    size: int
+    created: bool  # False when identical content was already stored
+
+    @property
+    def name(self) -> str:
+        return f"{self.digest}.{self.extension}"
+
+def image_path(name: str, thumbnail: Optional[int] = None) -> str:
+    """Originals are fanned out by digest prefix; thumbnails are always JPEG."""
+    if thumbnail:
+        return os.path.join(IMAGE_DIR, "thumbs", str(thumbnail), name[:2], name.rsplit(".", 1)[0] + ".jpg")
+    return os.path.join(IMAGE_DIR, name[:2], name)
+
+def _process_image(source: str, name_prefix: str, sizes: List[int]) -> str:
+    """Validate an upload and write its thumbnails; returns the image format.
+
+    Runs in the image pool: decoding and resampling are CPU-bound.
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(source) as image:
+            image.verify()
+        image = Image.open(source)
+    except Exception:
+        raise InvalidImage("File is not a supported image")
+
+    with image:
+        if image.format not in IMAGE_FORMATS:
+            raise InvalidImage(f"Unsupported image format: {image.format}")
+        for size in sizes:
+            thumbnail = image.convert("RGB")
+            thumbnail.thumbnail((size, size))
+            path = image_path(name_prefix, thumbnail=size)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            thumbnail.save(path, "JPEG", quality=85, optimize=True)
+        return image.format
+
+async def store_upload(chunks: AsyncIterable[bytes]) -> StoredImage:
+    """Stream an upload to disk, hashing as it goes, and store it by content.
+
+    ``chunks`` should come straight off the request body (see
+    ``src.core.uploads.multipart_file``): the size limit is checked as
+    each one arrives, so an oversized upload is rejected once it passes
+    MAX_UPLOAD_SIZE and the rest of the body is never read. Content that
+    is already stored keeps its file and thumbnails.
+    """
+    os.makedirs(IMAGE_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    buffer = bytearray()
+    spool = tempfile.NamedTemporaryFile(dir=IMAGE_DIR, suffix=".upload", delete=False)
+    try:
+        with spool:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > settings.MAX_UPLOAD_SIZE:
+                    raise ImageTooLarge()
+                digest.update(chunk)
+                buffer += chunk
+                if len(buffer) >= settings.UPLOAD_CHUNK_SIZE:
+                    await asyncio.to_thread(spool.write, bytes(buffer))
+                    buffer.clear()
+            if buffer:
+                await asyncio.to_thread(spool.write, bytes(buffer))
+        if not size:
+            raise InvalidImage("File is empty")
+
+        hex_digest = digest.hexdigest()
+        for extension, _ in IMAGE_FORMATS.values():
+            stored = StoredImage(hex_digest, extension, size, created=False)
+            if os.path.exists(image_path(stored.name)):
+                return stored
+
+        format = await image_pool.run(
+            _process_image, spool.name, hex_digest, settings.IMAGE_THUMBNAIL_SIZES
+        )
+        stored = StoredImage(hex_digest, IMAGE_FORMATS[format][0], size, created=True)
+        path = image_path(stored.name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(spool.name, path)
+        return stored
+    finally:
+        if os.path.exists(spool.name):
+            os.remove(spool.name)
@@ -0,0 +1,130 @@
+import asyncio
+import glob
+import html
+import os
+import tempfile
+from typing import Awaitable, Callable, List, Optional
+from uuid import UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.core.config import settings
+from src.core.process_pool import ProcessPool
+from src.models import PurchaseOrder
+from src.repositories.purchase_orders import orders_for_documents
+
+DOCUMENT_DIR = os.path.join(settings.UPLOAD_DIR, "po-documents")
+
+def _render_pdf(document: str) -> bytes:
+    # Imported in the pool process only; weasyprint is slow to import
+    from weasyprint import HTML
+
+    return HTML(string=document).write_pdf()
+
+document_renderer = ProcessPool(max_workers=settings.PO_RENDER_WORKERS)
+
+def document_path(order: PurchaseOrder) -> str:
+    """Any change to the order bumps updated_at, and with it the file name."""
+    return os.path.join(DOCUMENT_DIR, f"{order.id}-{order.updated_at:%Y%m%d%H%M%S%f}.pdf")
+
+def order_html(order: PurchaseOrder) -> str:
+    e = html.escape
+    rows = "".join(
+        "<tr>"
+        f"<td>{e(item.product.sku)}</td>"
+        f"<td>{e(item.product.name)}</td>"
+        f"<td class=\"num\">{item.quantity}</td>"
+        f"<td class=\"num\">{item.unit_price:.2f}</td>"
+        f"<td class=\"num\">{item.quantity * item.unit_price:.2f}</td>"
+        "</tr>"
+        for item in order.items
+    )
+    supplier = order.supplier
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<style>
+  body {{ font-family: sans-serif; font-size: 10pt; }}
+  table {{ width: 100%; border-collapse: collapse; }}
+  th, td {{ border-bottom: 1px solid #ccc; padding: 4pt; text-align: left; }}
+  .num {{ text-align: right; }}
+</style>
+</head>
+<body>
+<h1>Purchase Order</h1>
+<p>
+  Order: {order.id}<br>
+  Date: {order.created_at:%Y-%m-%d}<br>
+  Status: {e(order.status)}
+</p>
+<p>
+  <strong>{e(supplier.name)}</strong><br>
+  {e(supplier.contact_name or "")}<br>
+  {e(supplier.address or "")}<br>
+  {e(supplier.email or "")} {e(supplier.phone or "")}
+</p>
+<table>
+  <tr><th>SKU</th><th>Product</th><th class="num">Qty</th><th class="num">Unit price</th><th class="num">Amount</th></tr>
+  {rows}
+  <tr><th colspan="4" class="num">Total</th><th class="num">{order.total_amount:.2f}</th></tr>
+</table>
+<p>{e(order.notes or "")}</p>
+</body>
+</html>"""
+
+def _store_pdf(path: str, order_id: UUID, pdf: bytes) -> None:
+    os.makedirs(DOCUMENT_DIR, exist_ok=True)
+    # Write then rename, so a concurrent download never sees half a file
+    with tempfile.NamedTemporaryFile(dir=DOCUMENT_DIR, suffix=".tmp", delete=False) as file:
+        file.write(pdf)
+    os.replace(file.name, path)
+
+    # Earlier versions of this order are stale now
+    for stale in glob.glob(os.path.join(DOCUMENT_DIR, f"{order_id}-*.pdf")):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass  # Removed by a concurrent render
+
+async def ensure_document(order: PurchaseOrder) -> str:
+    """Path of the order's PDF, rendering it only if this version is not on disk."""
+    path = document_path(order)
+    if os.path.exists(path):
+        return path
+
+    pdf = await document_renderer.run(_render_pdf, order_html(order))
+    await asyncio.to_thread(_store_pdf, path, order.id, pdf)
+    return path
+
+async def get_order_document(db: AsyncSession, order_id: UUID) -> Optional[str]:
+    result = await db.execute(orders_for_documents().where(PurchaseOrder.id == order_id))
+    order = result.scalar_one_or_none()
+    return await ensure_document(order) if order else None
+
+async def render_supplier_documents(
+    db: AsyncSession,
+    supplier_id: UUID,
+    progress: Optional[Callable[[int, int], Awaitable[None]]] = None,
+) -> List[str]:
+    """Render every order of a supplier, a few pool-sized chunks at a time.
+
+    Only one chunk's HTML and pool futures exist at once, so a supplier
+    with thousands of orders does not queue them all up front.
+    """
+    result = await db.execute(
+        orders_for_documents()
+        .where(PurchaseOrder.supplier_id == supplier_id)
+        .order_by(PurchaseOrder.created_at, PurchaseOrder.id)
+    )
+    orders = result.scalars().all()
+
+    # Enough to keep every pool worker busy while results are collected
+    chunk_size = document_renderer.max_workers * 2
+    paths = []
+    for start in range(0, len(orders), chunk_size):
+        chunk = orders[start:start + chunk_size]
+        for rendered in asyncio.as_completed([ensure_document(order) for order in chunk]):
+            paths.append(await rendered)
+            if progress:
+                await progress(len(paths), len(orders))
+    return sorted(paths)
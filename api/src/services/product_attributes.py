@@ -0,0 +1,228 @@
+import json
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+from uuid import UUID
+from fastapi import HTTPException, Request
+from sqlalchemy import and_, case, cast, delete, func, or_, select, true
+from sqlalchemy.dialects.postgresql import JSONB, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models import AttributeFacetCount, Product, ProductAttributeValue
+from src.services.category_tree import category_filter
+
+# Query parameters of the form attr.<name>=<value>
+ATTRIBUTE_PREFIX = "attr."
+
+# jsonb_typeof names of the values that are indexed and can be filtered on
+SCALAR_TYPES = ("string", "number", "boolean")
+
+def attribute_filters(request: Request) -> Dict[str, List[str]]:
+    """Attribute filters from the query string; a repeated name lists alternatives."""
+    filters: Dict[str, List[str]] = {}
+    for name, value in request.query_params.multi_items():
+        if name.startswith(ATTRIBUTE_PREFIX) and len(name) > len(ATTRIBUTE_PREFIX):
+            try:
+                _candidates(value)
+            except InvalidAttributeValue:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Invalid value for {name}: {value}"
+                )
+            filters.setdefault(name[len(ATTRIBUTE_PREFIX):], []).append(value)
+    return filters
+
+class InvalidAttributeValue(ValueError):
+    """A number JSON cannot hold, such as NaN or 1e999."""
+
+def _reject_constant(name: str) -> float:
+    raise InvalidAttributeValue(name)
+
+def _candidates(value: str) -> list:
+    """A query value as text, plus as a number or boolean when it parses as one."""
+    try:
+        parsed = json.loads(value, parse_constant=_reject_constant)
+    except InvalidAttributeValue:
+        raise
+    except ValueError:
+        return [value]
+    if isinstance(parsed, float) and not math.isfinite(parsed):
+        raise InvalidAttributeValue(value)
+    return [value, parsed] if isinstance(parsed, (int, float, bool)) else [value]
+
+def attributes_condition(filters: Dict[str, List[str]]):
+    """Every attribute must match one of its values.
+
+    Each test is a containment check (attributes @> '{"size": "M"}'), which
+    the jsonb_path_ops GIN index on products.attributes answers.
+    """
+    return and_(*(
+        or_(*(
+            Product.attributes.contains({key: candidate})
+            for value in values
+            for candidate in _candidates(value)
+        ))
+        for key, values in filters.items()
+    ))
+
+def _flattened_attributes(product_ids: Optional[Iterable[UUID]] = None):
+    """(key, value, product_id) for scalar top-level attributes of products."""
+    # jsonb_each_text rejects anything but an object
+    attributes = case(
+        (func.jsonb_typeof(Product.attributes) == "object", Product.attributes),
+        else_=cast("{}", JSONB),
+    )
+    pairs = func.jsonb_each_text(attributes).table_valued("key", "value").lateral()
+    query = select(pairs.c.key, pairs.c.value, Product.id).select_from(Product).join(pairs, true())
+    if product_ids is not None:
+        query = query.where(Product.id.in_(product_ids))
+    # jsonb_each_text would also render objects and arrays as their JSON
+    # text, and nulls are not values to facet on
+    return query.where(func.jsonb_typeof(attributes.op("->")(pairs.c.key)).in_(SCALAR_TYPES))
+
+def _facet_counts_query(category_ids: Optional[Iterable[UUID]] = None):
+    query = select(
+        Product.category_id,
+        ProductAttributeValue.key,
+        ProductAttributeValue.value,
+        func.count(),
+    ).join(Product, Product.id == ProductAttributeValue.product_id).group_by(
+        Product.category_id, ProductAttributeValue.key, ProductAttributeValue.value
+    )
+    if category_ids is not None:
+        query = query.where(Product.category_id.in_(category_ids))
+    return query
+
+# Rows per facet count upsert, well under the bind parameter limit
+FACET_DELTA_BATCH_SIZE = 5_000
+
+async def _apply_facet_deltas(db: AsyncSession, deltas: Counter) -> None:
+    """Add signed product counts to (category_id, key, value) facet rows.
+
+    Adjusting only the rows that changed keeps a write proportional to
+    the products touched rather than to their categories' sizes, and
+    concurrent writers to a category only wait on the rows they share.
+    Rows are locked in a fixed order so those waits cannot deadlock.
+    """
+    ordered = sorted(deltas.items(), key=lambda item: (str(item[0][0]), item[0][1], item[0][2]))
+    rows = [
+        {"category_id": category_id, "key": key, "value": value, "product_count": delta}
+        for (category_id, key, value), delta in ordered
+        if delta
+    ]
+    for start in range(0, len(rows), FACET_DELTA_BATCH_SIZE):
+        stmt = insert(AttributeFacetCount).values(rows[start:start + FACET_DELTA_BATCH_SIZE])
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=list(AttributeFacetCount.__table__.primary_key.columns),
+            set_={"product_count": AttributeFacetCount.product_count + stmt.excluded.product_count},
+        ))
+    emptied = {row["category_id"] for row in rows if row["product_count"] < 0}
+    if emptied:
+        await db.execute(delete(AttributeFacetCount).where(
+            AttributeFacetCount.category_id.in_(emptied),
+            AttributeFacetCount.product_count <= 0,
+        ))
+
+async def _product_categories(db: AsyncSession, product_ids: Iterable[UUID]) -> Dict[UUID, UUID]:
+    result = await db.execute(select(Product.id, Product.category_id).where(Product.id.in_(product_ids)))
+    return dict(result.all())
+
+async def _remove_values(db: AsyncSession, product_ids: Iterable[UUID]) -> list:
+    """Delete the products' flattened values, returning (product_id, key, value)."""
+    result = await db.execute(
+        delete(ProductAttributeValue)
+        .where(ProductAttributeValue.product_id.in_(product_ids))
+        .returning(ProductAttributeValue.product_id, ProductAttributeValue.key, ProductAttributeValue.value)
+    )
+    return result.all()
+
+async def index_products(
+    db: AsyncSession,
+    product_ids: Iterable[UUID],
+    previous_categories: Optional[Dict[UUID, UUID]] = None,
+) -> None:
+    """Re-flatten the products' attributes and adjust their facet counts.
+
+    Each product's old values are subtracted and its new ones added.
+    ``previous_categories`` maps products that were just moved to the
+    category they left, which is where their old values were counted.
+    """
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+    previous_categories = previous_categories or {}
+    old = await _remove_values(db, product_ids)
+    new = await db.execute(
+        insert(ProductAttributeValue)
+        .from_select(["key", "value", "product_id"], _flattened_attributes(product_ids))
+        .returning(ProductAttributeValue.product_id, ProductAttributeValue.key, ProductAttributeValue.value)
+    )
+    categories = await _product_categories(db, product_ids)
+
+    deltas: Counter = Counter()
+    for product_id, key, value in old:
+        deltas[previous_categories.get(product_id, categories[product_id]), key, value] -= 1
+    for product_id, key, value in new:
+        deltas[categories[product_id], key, value] += 1
+    await _apply_facet_deltas(db, deltas)
+
+async def unindex_products(db: AsyncSession, product_ids: Iterable[UUID]) -> None:
+    """Drop the products' values from the index and counts; call before deleting them."""
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+    old = await _remove_values(db, product_ids)
+    categories = await _product_categories(db, product_ids)
+    deltas: Counter = Counter()
+    for product_id, key, value in old:
+        deltas[categories[product_id], key, value] -= 1
+    await _apply_facet_deltas(db, deltas)
+
+async def rebuild_attribute_index(db: AsyncSession) -> None:
+    """Rebuild the flattened values and every facet count from products."""
+    await db.execute(delete(ProductAttributeValue))
+    await db.execute(insert(ProductAttributeValue).from_select(
+        ["key", "value", "product_id"], _flattened_attributes()
+    ))
+    await db.execute(delete(AttributeFacetCount))
+    await db.execute(insert(AttributeFacetCount).from_select(
+        ["category_id", "key", "value", "product_count"], _facet_counts_query()
+    ))
+
+async def facet_counts(
+    db: AsyncSession,
+    category_id: Optional[UUID] = None,
+    include_descendants: bool = False,
+    filters: Optional[Dict[str, List[str]]] = None,
+) -> Dict[str, Dict[str, int]]:
+    """Product counts per attribute value among products matching the filters.
+
+    Without attribute filters the precomputed per-category counts are
+    summed, which does not touch products at all. With filters there is
+    no precomputed table to read: the matching products' flattened values
+    are counted on every call, so the cost grows with the number of
+    matches. Routes serve this through the response cache, which keeps
+    each filter combination until products change.
+    """
+    if filters:
+        matching = select(Product.id).where(attributes_condition(filters))
+        if category_id:
+            matching = matching.where(category_filter(Product.category_id, category_id, include_descendants))
+        count = func.count()
+        query = select(ProductAttributeValue.key, ProductAttributeValue.value, count).where(
+            ProductAttributeValue.product_id.in_(matching)
+        )
+        group = (ProductAttributeValue.key, ProductAttributeValue.value)
+    else:
+        count = func.sum(AttributeFacetCount.product_count)
+        query = select(AttributeFacetCount.key, AttributeFacetCount.value, count)
+        if category_id:
+            query = query.where(
+                category_filter(AttributeFacetCount.category_id, category_id, include_descendants)
+            )
+        group = (AttributeFacetCount.key, AttributeFacetCount.value)
+
+    result = await db.execute(query.group_by(*group).order_by(group[0], count.desc(), group[1]))
+    facets: Dict[str, Dict[str, int]] = {}
+    for key, value, product_count in result:
+        facets.setdefault(key, {})[value] = int(product_count)
+    return facets
@@ -0,0 +1,196 @@
+import asyncio
+import csv
+import json
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, IO, Iterator, List, Optional, Set
+from uuid import UUID
+from pydantic import ValidationError
+from sqlalchemy import literal_column, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models import Category, Product
+from src.schemas import ProductCreate
+from src.services.product_attributes import index_products
+from src.services.stock_alerts import refresh_stock_summaries
+
+# Columns a re-import of an existing SKU overwrites
+UPSERT_COLUMNS = [
+    "name",
+    "barcode",
+    "description",
+    "category_id",
+    "cost_price",
+    "sale_price",
+    "min_stock",
+    "image_url",
+    "attributes",
+]
+
+@dataclass
+class ImportJob:
+    id: UUID = field(default_factory=uuid.uuid4)
+    status: str = "pending"  # pending, running, completed, failed
+    processed: int = 0
+    inserted: int = 0
+    updated: int = 0
+    errors: List[dict] = field(default_factory=list)
+    detail: Optional[str] = None
+    # Products written so far, whose cached responses are now stale
+    product_ids: Set[UUID] = field(default_factory=set, repr=False)
+
+    def cache_tags(self) -> List[str]:
+        return ["products", *(f"product:{id}" for id in self.product_ids)]
+
+    def report(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "processed": self.processed,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "failed": len(self.errors),
+            "errors": self.errors,
+            "detail": self.detail,
+        }
+
+def iter_csv_batches(stream: IO[str], batch_size: int) -> Iterator[List[tuple]]:
+    """Yield (row_number, row) batches without reading the whole file."""
+    reader = csv.DictReader(stream)
+    batch = []
+    # Row 1 is the header
+    for row_number, row in enumerate(reader, start=2):
+        batch.append((row_number, row))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+async def load_category_map(db: AsyncSession) -> Dict[str, Optional[UUID]]:
+    """Map category ids and lower-cased names to ids, in one query.
+
+    Names repeat across the hierarchy (every department may have "Shirts"),
+    so a name shared by several categories maps to None.
+    """
+    result = await db.execute(select(Category.id, Category.name))
+    categories: Dict[str, Optional[UUID]] = {}
+    for id, name in result:
+        categories[str(id)] = id
+        key = name.strip().lower()
+        categories[key] = None if key in categories else id
+    return categories
+
+def parse_row(row: Dict[str, str], categories: Dict[str, Optional[UUID]]) -> ProductCreate:
+    data = {key.strip(): (value.strip() or None) for key, value in row.items() if key and value is not None}
+    category = data.pop("category", None) or data.get("category_id")
+    if category is None or category.lower() not in categories:
+        raise ValueError(f"Unknown category: {category}")
+    if categories[category.lower()] is None:
+        raise ValueError(f"Category name '{category}' matches more than one category; use its id")
+    data["category_id"] = categories[category.lower()]
+    if data.get("attributes"):
+        data["attributes"] = json.loads(data["attributes"])
+    return ProductCreate(**{key: value for key, value in data.items() if value is not None})
+
+async def upsert_batch(
+    db: AsyncSession,
+    job: ImportJob,
+    batch: List[tuple],
+    categories: Dict[str, Optional[UUID]],
+) -> None:
+    rows = []
+    row_numbers = []
+    seen_skus = set()
+    for row_number, row in batch:
+        try:
+            product = parse_row(row, categories)
+        except ValidationError as e:
+            job.errors.append({
+                "row": row_number,
+                "errors": [f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()],
+            })
+            continue
+        except ValueError as e:
+            job.errors.append({"row": row_number, "errors": [str(e)]})
+            continue
+
+        # ON CONFLICT cannot touch the same row twice in one statement
+        if product.sku in seen_skus:
+            job.errors.append({"row": row_number, "errors": ["Duplicate SKU in import batch"]})
+            continue
+        seen_skus.add(product.sku)
+        rows.append(product.model_dump())
+        row_numbers.append(row_number)
+
+    job.processed += len(batch)
+    if not rows:
+        return
+
+    stmt = insert(Product).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Product.sku],
+        set_={
+            **{column: stmt.excluded[column] for column in UPSERT_COLUMNS},
+            "updated_at": datetime.utcnow(),
+        },
+    ).returning(Product.id, literal_column("xmax = 0").label("inserted"))
+
+    try:
+        async with db.begin_nested():
+            # Re-imported products may change category; their old values come off the old one
+            previous = await db.execute(
+                select(Product.id, Product.category_id).where(Product.sku.in_(seen_skus))
+            )
+            previous_categories = dict(previous.all())
+            result = (await db.execute(stmt)).all()
+            inserted = sum(1 for row in result if row.inserted)
+            await refresh_stock_summaries(db, [row.id for row in result])
+            await index_products(db, [row.id for row in result], previous_categories)
+    except IntegrityError as e:
+        # A barcode clash (or similar) rejects the whole statement
+        message = str(e.orig).splitlines()[0]
+        job.errors.extend({"row": row_number, "errors": [message]} for row_number in row_numbers)
+        return
+
+    job.inserted += inserted
+    job.updated += len(rows) - inserted
+    job.product_ids.update(row.id for row in result)
+
+async def run_import(
+    db: AsyncSession,
+    job: ImportJob,
+    stream: IO[str],
+    batch_size: int,
+    progress: Optional[Callable[[ImportJob], Awaitable[None]]] = None,
+) -> ImportJob:
+    """Validate and upsert every row of a CSV stream, one batch per statement.
+
+    ``progress`` is awaited after each committed batch. A file that is not
+    UTF-8 or not valid CSV ends the import as failed, with the reason in
+    ``detail``; batches before the bad one stay committed.
+    """
+    job.status = "running"
+    batches = iter_csv_batches(stream, batch_size)
+    try:
+        categories = await load_category_map(db)
+        # Reading and parsing the file blocks, so it happens off the event loop
+        while (batch := await asyncio.to_thread(next, batches, None)) is not None:
+            await upsert_batch(db, job, batch, categories)
+            await db.commit()
+            if progress:
+                await progress(job)
+    except (UnicodeDecodeError, csv.Error) as e:
+        await db.rollback()
+        job.status = "failed"
+        job.detail = f"Unreadable CSV after row {job.processed + 1}: {e}"
+        return job
+    except Exception as e:
+        await db.rollback()
+        job.status = "failed"
+        job.detail = str(e)
+        raise
+    job.status = "completed"
+    return job
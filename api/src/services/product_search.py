@@ -0,0 +1,54 @@
+import re
+from typing import Optional
+from sqlalchemy import ColumnElement, Select, func, literal, or_, select
+from src.models import Product
+
+_token_re = re.compile(r"\w+", re.UNICODE)
+
+def _like_prefix(term: str) -> str:
+    """An ILIKE pattern matching ``term`` literally as a prefix."""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def prefix_tsquery(term: str) -> Optional[ColumnElement]:
+    """Build a tsquery where every word of the term is matched as a prefix."""
+    tokens = _token_re.findall(term.lower())
+    if not tokens:
+        return None
+    return func.to_tsquery("simple", " & ".join(f"{token}:*" for token in tokens))
+
+def search_condition(term: str) -> ColumnElement:
+    """Match products by full-text prefix, trigram similarity or code prefix.
+
+    Every branch is answered by a GIN index on products, so no branch
+    falls back to a sequential scan.
+    """
+    term = term.strip()
+    # ILIKE on the bare columns, which the gin_trgm_ops indexes support;
+    # istartswith would wrap them in lower() and miss the indexes
+    pattern = _like_prefix(term)
+    conditions = [
+        literal(term).op("<%")(Product.name),
+        Product.sku.ilike(pattern, escape="\\"),
+        Product.barcode.ilike(pattern, escape="\\"),
+    ]
+    tsquery = prefix_tsquery(term)
+    if tsquery is not None:
+        conditions.append(Product.search_vector.op("@@")(tsquery))
+    return or_(*conditions)
+
+def ranked_search(term: str, limit: int) -> Select:
+    """Return the best matches for a search box, most relevant first."""
+    term = term.strip()
+    rank = func.word_similarity(term, Product.name)
+    tsquery = prefix_tsquery(term)
+    if tsquery is not None:
+        rank = rank + func.ts_rank(Product.search_vector, tsquery)
+
+    # Exact code hits outrank any fuzzy name match
+    code_match = or_(Product.sku == term, Product.barcode == term)
+    return (
+        select(Product)
+        .where(search_condition(term))
+        .order_by(code_match.desc(), rank.desc(), Product.id)
+        .limit(limit)
+    )
@@ -0,0 +1,139 @@
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Set, Tuple
+from uuid import UUID
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models import Product, PurchaseOrder, PurchaseOrderItem, Supplier
+from src.schemas import PurchaseOrderCreate, ReplenishmentLine
+
+CENTS = Decimal("0.01")
+
+# Rows per INSERT; keeps a statement well under PostgreSQL's 32767 bind parameters
+ITEM_INSERT_BATCH = 2_000
+
+# Largest value purchase_orders.total_amount, a NUMERIC(12, 2), can hold
+MAX_ORDER_TOTAL = Decimal("9999999999.99")
+
+class OrderTooLarge(Exception):
+    def __init__(self, supplier_id: UUID, total: Decimal):
+        super().__init__(f"Order total {total} for supplier {supplier_id} exceeds {MAX_ORDER_TOTAL}")
+        self.supplier_id = supplier_id
+        self.total = total
+
+class UnpricedLines(Exception):
+    def __init__(self, product_ids: Set[UUID]):
+        super().__init__(
+            f"No unit price above zero for products: {', '.join(sorted(map(str, product_ids)))}"
+        )
+        self.product_ids = product_ids
+
+class UnknownReferences(Exception):
+    def __init__(self, kind: str, ids: Set[UUID]):
+        super().__init__(f"Unknown {kind}: {', '.join(sorted(map(str, ids)))}")
+        self.kind = kind
+        self.ids = ids
+
+@dataclass
+class OrderDraft:
+    supplier_id: UUID
+    notes: Optional[str] = None
+    # (product_id, quantity, unit_price)
+    lines: List[Tuple[UUID, int, Decimal]] = field(default_factory=list)
+
+    @property
+    def total(self) -> Decimal:
+        return sum((quantity * unit_price for _, quantity, unit_price in self.lines), Decimal(0)).quantize(CENTS)
+
+async def _check_exist(db: AsyncSession, model, ids: Set[UUID], kind: str) -> None:
+    result = await db.execute(select(model.id).where(model.id.in_(ids)))
+    missing = ids - set(result.scalars())
+    if missing:
+        raise UnknownReferences(kind, missing)
+
+async def create_orders(db: AsyncSession, drafts: List[OrderDraft], status: str = "draft") -> List[UUID]:
+    """Insert orders and all their items with a fixed number of statements; the caller commits.
+
+    Suppliers and products are validated up front, one query each, so a bad
+    id rejects the whole request before anything is written; so does an
+    order whose total does not fit the column, or a line priced at zero,
+    which the order schemas could not return.
+    """
+    unpriced = {product_id for draft in drafts for product_id, _, unit_price in draft.lines if unit_price <= 0}
+    if unpriced:
+        raise UnpricedLines(unpriced)
+    for draft in drafts:
+        if draft.total > MAX_ORDER_TOTAL:
+            raise OrderTooLarge(draft.supplier_id, draft.total)
+    await _check_exist(db, Supplier, {draft.supplier_id for draft in drafts}, "suppliers")
+    await _check_exist(
+        db, Product, {product_id for draft in drafts for product_id, _, _ in draft.lines}, "products"
+    )
+
+    now = datetime.utcnow()
+    orders = []
+    items = []
+    for draft in drafts:
+        order_id = uuid.uuid4()
+        orders.append({
+            "id": order_id,
+            "supplier_id": draft.supplier_id,
+            "status": status,
+            "total_amount": draft.total,
+            "notes": draft.notes,
+            "created_at": now,
+            "updated_at": now,
+        })
+        items.extend(
+            {
+                "id": uuid.uuid4(),
+                "po_id": order_id,
+                "product_id": product_id,
+                "quantity": quantity,
+                "unit_price": unit_price,
+                "received_quantity": 0,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for product_id, quantity, unit_price in draft.lines
+        )
+
+    await db.execute(insert(PurchaseOrder).values(orders))
+    for start in range(0, len(items), ITEM_INSERT_BATCH):
+        await db.execute(insert(PurchaseOrderItem).values(items[start:start + ITEM_INSERT_BATCH]))
+    return [order["id"] for order in orders]
+
+def draft_from_request(order_in: PurchaseOrderCreate) -> OrderDraft:
+    return OrderDraft(
+        supplier_id=order_in.supplier_id,
+        notes=order_in.notes,
+        lines=[(item.product_id, item.quantity, item.unit_price) for item in order_in.items],
+    )
+
+async def drafts_from_plan(
+    db: AsyncSession,
+    lines: List[ReplenishmentLine],
+    notes: Optional[str] = None,
+) -> List[OrderDraft]:
+    """One draft per supplier; lines without a price use the product's cost price.
+
+    A cost price that rounds to zero is kept, so create_orders rejects it.
+    """
+    unpriced = {line.product_id for line in lines if line.unit_price is None}
+    cost_prices: Dict[UUID, Decimal] = {}
+    if unpriced:
+        result = await db.execute(select(Product.id, Product.cost_price).where(Product.id.in_(unpriced)))
+        # cost_price is a float column; go through str to keep the cents exact
+        cost_prices = {id: Decimal(str(price)).quantize(CENTS) for id, price in result}
+        missing = unpriced - cost_prices.keys()
+        if missing:
+            raise UnknownReferences("products", missing)
+
+    drafts: Dict[UUID, OrderDraft] = {}
+    for line in lines:
+        draft = drafts.setdefault(line.supplier_id, OrderDraft(supplier_id=line.supplier_id, notes=notes))
+        unit_price = line.unit_price if line.unit_price is not None else cost_prices[line.product_id]
+        draft.lines.append((line.product_id, line.quantity, unit_price))
+    return list(drafts.values())
@@ -0,0 +1,197 @@
+import math
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Optional
+import numpy as np
+from sqlalchemy import Numeric, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.core.config import settings
+from src.models import (
+    MovementType,
+    Product,
+    ProductMovementDaily,
+    ProductStockSummary,
+    PurchaseOrder,
+    PurchaseOrderItem,
+)
+from src.services.purchase_orders import CENTS, OrderDraft
+
+# Orders whose unreceived quantity counts as already on the way
+OPEN_ORDER_STATUSES = ("draft", "ordered")
+
+# Arbitrary pg_advisory_xact_lock key serializing suggestion runs
+REPLENISHMENT_LOCK = 720_240
+
+@dataclass
+class ReorderPolicy:
+    history_days: int
+    lead_time_days: int
+    review_days: int
+    service_level_z: float
+
+    def __post_init__(self):
+        # The sample variance divides by history_days - 1
+        if self.history_days < 2:
+            raise ValueError(f"history_days must be at least 2, got {self.history_days}")
+
+    @classmethod
+    def from_settings(cls) -> "ReorderPolicy":
+        return cls(
+            history_days=settings.REORDER_HISTORY_DAYS,
+            lead_time_days=settings.REORDER_LEAD_TIME_DAYS,
+            review_days=settings.REORDER_REVIEW_DAYS,
+            service_level_z=settings.REORDER_SERVICE_LEVEL_Z,
+        )
+
+def _planning_query(since: date):
+    """One row per product with demand: OUT totals and sums of squares per
+    day, stock on hand and on order, and the supplier and price last ordered at.
+
+    Demand is read from the daily rollups, so the scan is one row per
+    product and day with sales rather than one per movement.
+    """
+    daily = select(
+        ProductMovementDaily.product_id,
+        func.sum(ProductMovementDaily.quantity).label("quantity"),
+    ).where(
+        ProductMovementDaily.type == MovementType.OUT,
+        ProductMovementDaily.day >= since,
+    ).group_by(ProductMovementDaily.product_id, ProductMovementDaily.day).subquery()
+
+    demand = select(
+        daily.c.product_id,
+        func.sum(daily.c.quantity).label("total"),
+        func.sum(daily.c.quantity * daily.c.quantity).label("total_squares"),
+    ).group_by(daily.c.product_id).subquery()
+
+    on_order = select(
+        PurchaseOrderItem.product_id,
+        func.sum(PurchaseOrderItem.quantity - func.coalesce(PurchaseOrderItem.received_quantity, 0)).label("quantity"),
+    ).join(PurchaseOrder).where(
+        PurchaseOrder.status.in_(OPEN_ORDER_STATUSES)
+    ).group_by(PurchaseOrderItem.product_id).subquery()
+
+    last_ordered = select(
+        PurchaseOrderItem.product_id,
+        PurchaseOrder.supplier_id,
+        PurchaseOrderItem.unit_price,
+    ).join(PurchaseOrder).order_by(
+        PurchaseOrderItem.product_id,
+        PurchaseOrder.created_at.desc(),
+    ).distinct(PurchaseOrderItem.product_id).subquery()
+
+    return select(
+        demand.c.product_id,
+        demand.c.total,
+        demand.c.total_squares,
+        func.coalesce(ProductStockSummary.total_stock, 0),
+        func.coalesce(ProductStockSummary.min_stock, 0),
+        func.coalesce(on_order.c.quantity, 0),
+        last_ordered.c.supplier_id,
+        func.coalesce(last_ordered.c.unit_price, cast(Product.cost_price, Numeric(10, 2))),
+    ).select_from(demand).join(
+        Product, Product.id == demand.c.product_id
+    ).outerjoin(
+        ProductStockSummary, ProductStockSummary.product_id == demand.c.product_id
+    ).outerjoin(
+        on_order, on_order.c.product_id == demand.c.product_id
+    ).outerjoin(
+        last_ordered, last_ordered.c.product_id == demand.c.product_id
+    )
+
+def reorder_quantities(
+    policy: ReorderPolicy,
+    total: np.ndarray,
+    total_squares: np.ndarray,
+    on_hand: np.ndarray,
+    min_stock: np.ndarray,
+    on_order: np.ndarray,
+) -> Dict[str, np.ndarray]:
+    """Reorder point and order quantity for every product at once.
+
+    Daily demand has mean ``total / days`` and a sample variance that
+    counts days without sales as zero. Safety stock covers demand
+    variability over the lead time at the policy's service level; an
+    order is due once stock on hand plus on order falls to the reorder
+    point, and brings it up to cover lead time plus the review period.
+    """
+    days = policy.history_days
+    mean = total / days
+    variance = np.maximum(total_squares / days - mean ** 2, 0) * days / (days - 1)
+    safety_stock = policy.service_level_z * np.sqrt(variance) * math.sqrt(policy.lead_time_days)
+    reorder_point = np.maximum(mean * policy.lead_time_days + safety_stock, min_stock)
+    order_up_to = np.maximum(mean * (policy.lead_time_days + policy.review_days) + safety_stock, reorder_point)
+    position = on_hand + on_order
+    quantity = np.where(position <= reorder_point, np.ceil(order_up_to - position), 0)
+    return {
+        "daily_demand": mean,
+        "demand_stddev": np.sqrt(variance),
+        "reorder_point": reorder_point,
+        "quantity": np.maximum(quantity, 0).astype(np.int64),
+    }
+
+async def suggest_reorders(
+    db: AsyncSession,
+    policy: ReorderPolicy,
+    today: Optional[date] = None,
+) -> dict:
+    """Compute suggestions for every product with demand in the history window.
+
+    Returns the per-supplier drafts plus the suggested lines, largest first.
+    Open orders, drafts included, count as stock on the way, so a second
+    run does not order the same shortfall again. Runs are serialized with a
+    transaction-level advisory lock for that reason; the caller commits.
+    """
+    await db.execute(select(func.pg_advisory_xact_lock(REPLENISHMENT_LOCK)))
+    # history_days days including today, the number demand is averaged over
+    since = (today or date.today()) - timedelta(days=policy.history_days - 1)
+    rows = (await db.execute(_planning_query(since))).all()
+    if not rows:
+        return {"products_analyzed": 0, "without_supplier": 0, "without_price": 0, "lines": [], "drafts": []}
+
+    product_ids, total, squares, on_hand, min_stock, on_order, supplier_ids, prices = zip(*rows)
+    plan = reorder_quantities(
+        policy,
+        np.array(total, dtype=np.float64),
+        np.array(squares, dtype=np.float64),
+        np.array(on_hand, dtype=np.float64),
+        np.array(min_stock, dtype=np.float64),
+        np.array(on_order, dtype=np.float64),
+    )
+    quantity = plan["quantity"]
+    has_supplier = np.array([supplier_id is not None for supplier_id in supplier_ids])
+    # An order line needs a price above zero; a cost price of 0 is not one
+    has_price = np.array([Decimal(price).quantize(CENTS) > 0 for price in prices])
+    due = quantity > 0
+    orderable = due & has_supplier & has_price
+
+    lines = []
+    drafts: Dict[object, OrderDraft] = {}
+    # Largest orders first, so a truncated listing shows what matters most
+    for index in np.flatnonzero(orderable)[np.argsort(-quantity[orderable], kind="stable")]:
+        unit_price = Decimal(prices[index]).quantize(CENTS)
+        line = {
+            "product_id": product_ids[index],
+            "supplier_id": supplier_ids[index],
+            "quantity": int(quantity[index]),
+            "unit_price": unit_price,
+            "daily_demand": round(float(plan["daily_demand"][index]), 3),
+            "demand_stddev": round(float(plan["demand_stddev"][index]), 3),
+            "reorder_point": round(float(plan["reorder_point"][index]), 1),
+            "on_hand": int(on_hand[index]),
+            "on_order": int(on_order[index]),
+        }
+        lines.append(line)
+        draft = drafts.setdefault(line["supplier_id"], OrderDraft(supplier_id=line["supplier_id"]))
+        draft.lines.append((line["product_id"], line["quantity"], unit_price))
+
+    return {
+        "products_analyzed": len(rows),
+        # Due for reorder but never ordered from any supplier
+        "without_supplier": int(np.count_nonzero(due & ~has_supplier)),
+        # Due and with a supplier, but with no price to order at
+        "without_price": int(np.count_nonzero(due & has_supplier & ~has_price)),
+        "lines": lines,
+        "drafts": list(drafts.values()),
+    }
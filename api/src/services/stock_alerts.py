@@ -0,0 +1,104 @@
+from typing import Iterable, Optional
+from uuid import UUID
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.core.database import async_session
+from src.models import Product, ProductStockSummary, StockAlertSeverity, StockLevel
+
+# Products reconciled per transaction; bounds how long summary rows stay locked
+RECONCILE_BATCH_SIZE = 5_000
+
+def alert_severity(stock, min_stock):
+    """StockAlertSeverity value for a quantity already known to be low."""
+    return case(
+        (stock <= 0, StockAlertSeverity.OUT.value),
+        (stock * 2 <= min_stock, StockAlertSeverity.CRITICAL.value),
+        else_=StockAlertSeverity.LOW.value,
+    )
+
+def _summary_query(product_ids: Optional[Iterable[UUID]] = None):
+    total_stock = func.coalesce(func.sum(StockLevel.quantity), 0)
+    min_stock = func.coalesce(Product.min_stock, 0)
+    query = select(
+        Product.id,
+        total_stock,
+        min_stock,
+        min_stock - total_stock,
+        alert_severity(total_stock, min_stock),
+        total_stock <= min_stock,
+        func.now(),
+    ).outerjoin(StockLevel).group_by(Product.id)
+    if product_ids is not None:
+        query = query.where(Product.id.in_(product_ids))
+    return query
+
+async def refresh_stock_summaries(
+    db: AsyncSession,
+    product_ids: Optional[Iterable[UUID]] = None,
+) -> None:
+    """Recompute summaries for the given products (all when None) in one statement.
+
+    The products' summary rows are locked first, in a statement of their
+    own. A concurrent writer to another location of the same product then
+    waits for this transaction, and its recompute, being a new statement
+    under READ COMMITTED, sees the committed levels instead of summing
+    around them.
+    """
+    if product_ids is not None:
+        product_ids = set(product_ids)
+        if not product_ids:
+            return
+        await db.execute(
+            select(ProductStockSummary.product_id)
+            .where(ProductStockSummary.product_id.in_(product_ids))
+            .order_by(ProductStockSummary.product_id)
+            .with_for_update()
+        )
+
+    stmt = insert(ProductStockSummary).from_select(
+        [
+            ProductStockSummary.product_id,
+            ProductStockSummary.total_stock,
+            ProductStockSummary.min_stock,
+            ProductStockSummary.shortfall,
+            ProductStockSummary.severity,
+            ProductStockSummary.is_low,
+            ProductStockSummary.updated_at,
+        ],
+        _summary_query(product_ids),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ProductStockSummary.product_id],
+        set_={
+            column: stmt.excluded[column]
+            for column in (
+                "total_stock",
+                "min_stock",
+                "shortfall",
+                "severity",
+                "is_low",
+                "updated_at",
+            )
+        },
+    )
+    await db.execute(stmt)
+
+async def reconcile_stock_summaries() -> None:
+    """Rebuild every summary from stock_levels, repairing any drift.
+
+    Works through products in id order, one locked batch per transaction,
+    so it never overwrites a summary a concurrent movement just refreshed.
+    """
+    after = None
+    while True:
+        async with async_session() as session:
+            query = select(Product.id).order_by(Product.id).limit(RECONCILE_BATCH_SIZE)
+            if after is not None:
+                query = query.where(Product.id > after)
+            product_ids = (await session.execute(query)).scalars().all()
+            if not product_ids:
+                return
+            await refresh_stock_summaries(session, product_ids)
+            await session.commit()
+        after = product_ids[-1]
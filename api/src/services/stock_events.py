@@ -0,0 +1,222 @@
+import asyncio
+import json
+import logging
+import re
+from typing import AsyncIterator, Iterable, List, Optional, Set, Tuple
+from fastapi import Request
+from redis.exceptions import RedisError
+from src.core.config import settings
+from src.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Stock changes are appended to a Redis stream rather than sent with plain
+# PUBLISH: the stream keeps recent history, which is what lets a client
+# resume from its Last-Event-ID after a disconnect
+STREAM_KEY = "stock-events"
+
+STREAM_ID = re.compile(r"^\d+-\d+$")
+
+def _id_key(event_id: str) -> Tuple[int, int]:
+    ms, seq = event_id.split("-")
+    return int(ms), int(seq)
+
+async def publish_stock_events(events: List[dict]) -> None:
+    """Append events to the stream; call after the writing transaction commits.
+
+    A Redis outage loses the events but never fails the stock change.
+    """
+    if not events:
+        return
+    try:
+        async with get_redis().pipeline(transaction=False) as pipe:
+            for event in events:
+                pipe.xadd(
+                    STREAM_KEY,
+                    {"data": json.dumps(event, default=str)},
+                    maxlen=settings.STOCK_EVENTS_STREAM_MAXLEN,
+                    approximate=True,
+                )
+            await pipe.execute()
+    except RedisError:
+        logger.warning("Could not publish %d stock events", len(events), exc_info=True)
+
+class Subscription:
+    """One client's filter and bounded buffer of pending events."""
+
+    def __init__(
+        self,
+        product_ids: Optional[Iterable[str]],
+        locations: Optional[Iterable[str]],
+        maxsize: int,
+    ):
+        self.product_ids: Optional[Set[str]] = set(product_ids) if product_ids else None
+        self.locations: Optional[Set[str]] = set(locations) if locations else None
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def matches(self, event: dict) -> bool:
+        return (
+            (self.product_ids is None or event["product_id"] in self.product_ids)
+            and (self.locations is None or event["location"] in self.locations)
+        )
+
+    def offer(self, event_id: str, event: dict) -> bool:
+        """Queue a matching event; returns whether it was queued."""
+        if self.overflowed or not self.matches(event):
+            return False
+        try:
+            self.queue.put_nowait((event_id, event))
+            return True
+        except asyncio.QueueFull:
+            # A client this far behind is disconnected and resumes from Redis
+            self.overflowed = True
+            return False
+
+class StockEventHub:
+    """Fans the stream out to every subscriber in this process.
+
+    A single reader blocks on XREAD however many clients are connected, and
+    each client gets a bounded queue so a slow one cannot hold up the rest.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.subscribers: Set[Subscription] = set()
+        self._reader: Optional[asyncio.Task] = None
+        # Set once the reader knows where in the stream it starts
+        self._started = asyncio.Event()
+        self.delivered = 0
+        self.overflows = 0
+
+    async def subscribe(
+        self,
+        product_ids: Optional[Iterable[str]] = None,
+        locations: Optional[Iterable[str]] = None,
+    ) -> Subscription:
+        """Add a subscriber once the reader has fixed its starting position.
+
+        Every event after that position reaches the new subscriber, so a
+        replay read after this returns cannot leave a gap before the live
+        events. Raises RedisError if the stream stays unreachable.
+        """
+        subscription = Subscription(product_ids, locations, self.queue_size)
+        self.subscribers.add(subscription)
+        if self._reader is None or self._reader.done():
+            self._started = asyncio.Event()
+            self._reader = asyncio.create_task(self._read_loop())
+        try:
+            await asyncio.wait_for(self._started.wait(), timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self.unsubscribe(subscription)
+            raise RedisError("Stock event stream reader did not start")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscribers.discard(subscription)
+        if subscription.overflowed:
+            self.overflows += 1
+
+    async def _latest_id(self) -> str:
+        entries = await get_redis().xrevrange(STREAM_KEY, count=1)
+        return entries[0][0] if entries else "0-0"
+
+    async def _read_loop(self) -> None:
+        last_id = None
+        while True:
+            try:
+                redis = get_redis()
+                if last_id is None:
+                    last_id = await self._latest_id()
+                    self._started.set()
+                # Blocks for less than REDIS_SOCKET_TIMEOUT_SECONDS
+                entries = await redis.xread({STREAM_KEY: last_id}, block=2_000, count=500)
+            except RedisError:
+                logger.warning("Stock event stream unavailable", exc_info=True)
+                await asyncio.sleep(1)
+                continue
+            for _, messages in entries:
+                for event_id, fields in messages:
+                    last_id = event_id
+                    event = json.loads(fields["data"])
+                    for subscription in list(self.subscribers):
+                        if subscription.offer(event_id, event):
+                            self.delivered += 1
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "delivered": self.delivered,
+            "overflows": self.overflows,
+        }
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+
+stock_event_hub = StockEventHub(queue_size=settings.STOCK_EVENTS_QUEUE_SIZE)
+
+UNAVAILABLE = "event: unavailable\ndata: {}\n\n"
+
+def _sse(event_id: str, event: dict) -> str:
+    return f"id: {event_id}\nevent: stock\ndata: {json.dumps(event)}\n\n"
+
+async def stream_stock_events(
+    request: Request,
+    product_ids: Optional[List[str]] = None,
+    locations: Optional[List[str]] = None,
+    last_event_id: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """Server-sent events for matching stock changes.
+
+    With ``last_event_id`` the events the client missed are replayed from
+    the stream first, as far back as STOCK_EVENTS_STREAM_MAXLEN reaches.
+    A client whose buffer overflows gets an ``overflow`` event and is
+    disconnected; reconnecting with its Last-Event-ID picks up from there.
+    The same goes for an ``unavailable`` event, sent when Redis cannot be
+    read.
+    """
+    # Subscribe before replaying, so nothing falls between the two
+    try:
+        subscription = await stock_event_hub.subscribe(product_ids, locations)
+    except RedisError:
+        logger.warning("Stock event stream unavailable", exc_info=True)
+        yield UNAVAILABLE
+        return
+    sent = last_event_id
+    try:
+        while sent:
+            try:
+                backlog = await get_redis().xrange(STREAM_KEY, min=f"({sent}", count=500)
+            except RedisError:
+                logger.warning("Could not replay stock events after %s", sent, exc_info=True)
+                # The client reconnects with the last id it got and resumes there
+                yield UNAVAILABLE
+                return
+            if not backlog:
+                break
+            for event_id, fields in backlog:
+                sent = event_id
+                event = json.loads(fields["data"])
+                if subscription.matches(event):
+                    yield _sse(event_id, event)
+
+        while not await request.is_disconnected():
+            if subscription.overflowed and subscription.queue.empty():
+                yield "event: overflow\ndata: {}\n\n"
+                break
+            try:
+                event_id, event = await asyncio.wait_for(
+                    subscription.queue.get(), timeout=settings.STOCK_EVENTS_HEARTBEAT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                # Comment line; keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                continue
+            if sent and _id_key(event_id) <= _id_key(sent):
+                continue  # Already replayed from the backlog
+            sent = event_id
+            yield _sse(event_id, event)
+    finally:
+        stock_event_hub.unsubscribe(subscription)
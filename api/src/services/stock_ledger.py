@@ -0,0 +1,479 @@
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+from uuid import UUID
+from sqlalchemy import Integer, column, delete, func, literal, select, tuple_, update, values
+from sqlalchemy.dialects.postgresql import UUID as PGUUID
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+from src.models import MovementType, Product, StockLevel, StockMovement
+from src.schemas import StockMovementBatchItem, StockMovementBatchResult
+from src.services.stock_alerts import refresh_stock_summaries
+from src.services.stock_rollups import record_movements
+
+T = TypeVar("T")
+
+DEFAULT_LOCATION = "main"
+
+# serialization_failure, deadlock_detected
+RETRYABLE_SQLSTATES = {"40001", "40P01"}
+
+# Advisory lock key: movement writers hold it shared, snapshots exclusively
+LEDGER_LOCK = 720_016
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id: UUID, location: str):
+        super().__init__(f"Not enough stock for {product_id} at {location}")
+        self.product_id = product_id
+        self.location = location
+
+def _queue_events(db: AsyncSession, events: List[dict]) -> None:
+    """Hold stock events on the session until the transaction commits."""
+    db.info.setdefault("stock_events", []).extend(events)
+
+def pop_stock_events(db: AsyncSession) -> List[dict]:
+    """Events for the changes just committed, for stock_events.publish_stock_events."""
+    return db.info.pop("stock_events", [])
+
+def _event(movement: dict, level: int) -> dict:
+    return {
+        "movement_id": movement["id"],
+        "product_id": movement["product_id"],
+        "location": movement["location"],
+        "type": MovementType(movement["type"]).value,
+        "quantity": movement["quantity"],
+        "level": level,
+        "reference_id": movement["reference_id"],
+        "at": movement["created_at"],
+    }
+
+async def ledger_clock(db: AsyncSession) -> datetime:
+    """Take the ledger lock shared and return the database clock as naive UTC.
+
+    Writers call this before touching stock levels and stamp their
+    movements with the result. A snapshot holds the lock exclusively while
+    it stamps ``taken_at`` and copies the levels, so a movement is either
+    committed before the copy with an earlier time, or stamped after it.
+    """
+    # The clock is read from the lock's row, so only once the lock is held
+    lock = select(func.pg_advisory_xact_lock_shared(LEDGER_LOCK).label("locked")).cte("ledger_lock")
+    result = await db.execute(
+        select(func.timezone("utc", func.clock_timestamp())).select_from(lock)
+    )
+    return result.scalar_one()
+
+def is_retryable(error: BaseException) -> bool:
+    if not isinstance(error, DBAPIError):
+        return False
+    orig = error.orig
+    sqlstate = (
+        getattr(orig, "sqlstate", None)
+        or getattr(orig, "pgcode", None)
+        or getattr(getattr(orig, "__cause__", None), "sqlstate", None)
+    )
+    return sqlstate in RETRYABLE_SQLSTATES
+
+async def run_in_transaction(
+    db: AsyncSession,
+    operation: Callable[[], Awaitable[T]],
+    attempts: int = 5,
+) -> T:
+    """Run and commit ``operation``, retrying it on serialization failures and deadlocks."""
+    async for attempt in AsyncRetrying(
+        retry=retry_if_exception(is_retryable),
+        stop=stop_after_attempt(attempts),
+        wait=wait_random_exponential(multiplier=0.01, max=0.5),
+        reraise=True,
+    ):
+        with attempt:
+            try:
+                result = await operation()
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                pop_stock_events(db)
+                raise
+    return result
+
+async def change_quantity(
+    db: AsyncSession,
+    product_id: UUID,
+    location: str,
+    type: MovementType,
+    quantity: int,
+) -> int:
+    """Apply a movement to a stock level in a single statement; return the new quantity.
+
+    IN and ADJUST upsert the level row. OUT is a conditional decrement that
+    matches no row when stock is short, so concurrent sales cannot drive
+    the quantity negative or lose an update.
+    """
+    if type == MovementType.OUT:
+        result = await db.execute(
+            update(StockLevel)
+            .where(
+                StockLevel.product_id == product_id,
+                StockLevel.location == location,
+                StockLevel.quantity >= quantity,
+            )
+            .values(quantity=StockLevel.quantity - quantity)
+            .returning(StockLevel.quantity)
+        )
+        new_quantity = result.scalar_one_or_none()
+        if new_quantity is None:
+            raise InsufficientStock(product_id, location)
+        return new_quantity
+
+    stmt = insert(StockLevel).values(
+        product_id=product_id,
+        location=location,
+        quantity=quantity,
+    )
+    if type == MovementType.IN:
+        new_value = StockLevel.quantity + stmt.excluded.quantity
+    else:  # ADJUST
+        new_value = stmt.excluded.quantity
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_stock_levels_product_location",
+        set_={"quantity": new_value, "updated_at": stmt.excluded.updated_at},
+    ).returning(StockLevel.quantity)
+    result = await db.execute(stmt)
+    return result.scalar_one()
+
+async def apply_movement(
+    db: AsyncSession,
+    product_id: UUID,
+    type: MovementType,
+    quantity: int,
+    location: str = DEFAULT_LOCATION,
+    reference_id: Optional[UUID] = None,
+    notes: Optional[str] = None,
+) -> StockMovement:
+    """Record a movement and update its stock level; the caller commits."""
+    type = MovementType(type)
+    if type == MovementType.TRANSFER:
+        raise ValueError("Transfers change two locations; use transfer_stock")
+    now = await ledger_clock(db)
+    level = await change_quantity(db, product_id, location, type, quantity)
+    await refresh_stock_summaries(db, [product_id])
+    await record_movements(db, [(now.date(), product_id, location, type, quantity)])
+    values = {
+        "product_id": product_id,
+        "location": location,
+        "type": type,
+        "quantity": quantity,
+        "reference_id": reference_id,
+        "notes": notes,
+        "created_at": now,
+        "updated_at": now,
+    }
+    movement = StockMovement(**values)
+    db.add(movement)
+    await db.flush()
+    _queue_events(db, [_event({**values, "id": movement.id}, level)])
+    return movement
+
+async def transfer_stock(
+    db: AsyncSession,
+    product_id: UUID,
+    quantity: int,
+    from_location: str,
+    to_location: str,
+    reference_id: Optional[UUID] = None,
+    notes: Optional[str] = None,
+) -> List[StockMovement]:
+    """Move stock between two locations; the caller commits.
+
+    The debit and the credit are one statement: a conditional decrement
+    of the source that matches no row when stock is short, feeding an
+    upsert of the destination, so neither side can apply without the
+    other. Both movement rows share the reference id (a new one when none
+    is given) and the source row carries the negative quantity.
+    """
+    now = await ledger_clock(db)
+    debit = (
+        update(StockLevel)
+        .where(
+            StockLevel.product_id == product_id,
+            StockLevel.location == from_location,
+            StockLevel.quantity >= quantity,
+        )
+        .values(quantity=StockLevel.quantity - quantity, updated_at=now)
+        .returning(StockLevel.quantity)
+        .cte("debit")
+    )
+    credit = insert(StockLevel).from_select(
+        ["id", "product_id", "location", "quantity", "created_at", "updated_at"],
+        select(
+            literal(uuid.uuid4(), PGUUID(as_uuid=True)),
+            literal(product_id, PGUUID(as_uuid=True)),
+            literal(to_location),
+            literal(quantity),
+            literal(now),
+            literal(now),
+        ).select_from(debit),
+    )
+    credit = credit.on_conflict_do_update(
+        constraint="uq_stock_levels_product_location",
+        set_={"quantity": StockLevel.quantity + credit.excluded.quantity, "updated_at": now},
+    ).returning(StockLevel.quantity).cte("credit")
+    levels = (await db.execute(select(debit.c.quantity, credit.c.quantity))).one_or_none()
+    if levels is None:
+        raise InsufficientStock(product_id, from_location)
+
+    reference_id = reference_id or uuid.uuid4()
+    movements = [
+        {
+            "id": uuid.uuid4(),
+            "product_id": product_id,
+            "location": location,
+            "type": MovementType.TRANSFER,
+            "quantity": signed_quantity,
+            "reference_id": reference_id,
+            "notes": notes,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for location, signed_quantity in ((from_location, -quantity), (to_location, quantity))
+    ]
+    await db.execute(insert(StockMovement).values(movements))
+    # The product's total is unchanged, so its summary needs no refresh
+    await record_movements(db, [
+        (now.date(), product_id, movement["location"], MovementType.TRANSFER, movement["quantity"])
+        for movement in movements
+    ])
+    _queue_events(db, [_event(movement, level) for movement, level in zip(movements, levels)])
+    return [StockMovement(**movement) for movement in movements]
+
+async def apply_movement_batch(
+    db: AsyncSession,
+    items: List[StockMovementBatchItem],
+) -> List[StockMovementBatchResult]:
+    """Apply many movements with a fixed number of statements; the caller commits.
+
+    Items are applied in order against locked level rows, so an OUT later in
+    the batch sees the INs before it. Items whose idempotency key was already
+    recorded are reported as duplicates and change nothing.
+    """
+    results: List[Optional[StockMovementBatchResult]] = [None] * len(items)
+
+    keys = {item.idempotency_key for item in items if item.idempotency_key}
+    recorded: Dict[str, UUID] = {}
+    if keys:
+        result = await db.execute(
+            select(StockMovement.idempotency_key, StockMovement.id)
+            .where(StockMovement.idempotency_key.in_(keys))
+        )
+        recorded = dict(result.all())
+
+    product_ids = {item.product_id for item in items}
+    result = await db.execute(select(Product.id).where(Product.id.in_(product_ids)))
+    known_products = set(result.scalars())
+
+    pending = []
+    repeated = []  # (index, index of the earlier item with the same key)
+    first_with_key: Dict[str, int] = {}
+    for index, item in enumerate(items):
+        if item.idempotency_key in recorded:
+            results[index] = StockMovementBatchResult(
+                index=index,
+                status="duplicate",
+                movement_id=recorded[item.idempotency_key],
+            )
+        elif item.idempotency_key in first_with_key:
+            repeated.append((index, first_with_key[item.idempotency_key]))
+        elif item.product_id not in known_products:
+            results[index] = StockMovementBatchResult(
+                index=index,
+                status="rejected",
+                detail="Product not found",
+            )
+        elif item.type not in MovementType._value2member_map_:
+            results[index] = StockMovementBatchResult(
+                index=index,
+                status="rejected",
+                detail="Invalid movement type",
+            )
+        elif item.type == MovementType.TRANSFER.value:
+            results[index] = StockMovementBatchResult(
+                index=index,
+                status="rejected",
+                detail="Transfers move stock between locations; send them to POST /inventory/transfers",
+            )
+        else:
+            if item.idempotency_key:
+                first_with_key[item.idempotency_key] = index
+            pending.append((index, uuid.uuid4(), item))
+
+    if pending:
+        await _apply_pending(db, pending, results)
+
+    for index, original in repeated:
+        earlier = results[original]
+        if earlier.status == "rejected":
+            results[index] = earlier.model_copy(update={"index": index})
+        else:
+            results[index] = StockMovementBatchResult(
+                index=index,
+                status="duplicate",
+                movement_id=earlier.movement_id,
+            )
+    return results
+
+async def _apply_pending(
+    db: AsyncSession,
+    pending: List[Tuple[int, UUID, StockMovementBatchItem]],
+    results: List[Optional[StockMovementBatchResult]],
+) -> None:
+    now = await ledger_clock(db)
+
+    # Make sure every level row exists, then lock them in a stable order so
+    # concurrent batches cannot deadlock on each other
+    level_keys = sorted({(item.product_id, item.location) for _, _, item in pending})
+    result = await db.execute(
+        insert(StockLevel)
+        .values([
+            {"product_id": product_id, "location": location, "quantity": 0}
+            for product_id, location in level_keys
+        ])
+        .on_conflict_do_nothing(constraint="uq_stock_levels_product_location")
+        .returning(StockLevel.product_id, StockLevel.location)
+    )
+    created = set(result.tuples())
+    result = await db.execute(
+        select(StockLevel.product_id, StockLevel.location, StockLevel.id, StockLevel.quantity)
+        .where(tuple_(StockLevel.product_id, StockLevel.location).in_(level_keys))
+        .order_by(StockLevel.product_id, StockLevel.location)
+        .with_for_update()
+    )
+    levels: Dict[Tuple[UUID, str], list] = {
+        (row.product_id, row.location): [row.id, row.quantity] for row in result
+    }
+
+    movements = []
+    events = []
+    rollup_entries = []
+    changed = set()
+    for index, movement_id, item in pending:
+        level = levels[(item.product_id, item.location)]
+        type = MovementType(item.type)
+        if type == MovementType.IN:
+            new_quantity = level[1] + item.quantity
+        elif type == MovementType.OUT:
+            new_quantity = level[1] - item.quantity
+        else:  # ADJUST
+            new_quantity = item.quantity
+
+        if new_quantity < 0:
+            results[index] = StockMovementBatchResult(
+                index=index,
+                status="rejected",
+                quantity=level[1],
+                detail="Not enough stock",
+            )
+            continue
+
+        level[1] = new_quantity
+        changed.add((item.product_id, item.location))
+        rollup_entries.append((now.date(), item.product_id, item.location, type, item.quantity))
+        movements.append({
+            "id": movement_id,
+            "product_id": item.product_id,
+            "location": item.location,
+            "type": type,
+            "quantity": item.quantity,
+            "reference_id": item.reference_id,
+            "notes": item.notes,
+            "idempotency_key": item.idempotency_key,
+            "created_at": now,
+            "updated_at": now,
+        })
+        events.append(_event(movements[-1], new_quantity))
+        results[index] = StockMovementBatchResult(
+            index=index,
+            status="applied",
+            movement_id=movement_id,
+            quantity=new_quantity,
+        )
+
+    # Rows created above for items that were all rejected would otherwise
+    # list a location that never held stock
+    unused = [levels[key][0] for key in sorted(created - changed)]
+    if unused:
+        await db.execute(delete(StockLevel).where(StockLevel.id.in_(unused)))
+
+    if not movements:
+        return
+
+    new_levels = values(
+        column("id", PGUUID(as_uuid=True)),
+        column("quantity", Integer),
+        name="new_levels",
+    ).data([tuple(levels[key]) for key in sorted(changed)])
+    await db.execute(
+        update(StockLevel)
+        .where(StockLevel.id == new_levels.c.id)
+        .values(quantity=new_levels.c.quantity, updated_at=now)
+    )
+    await db.execute(insert(StockMovement).values(movements))
+    await refresh_stock_summaries(db, {product_id for product_id, _ in changed})
+    await record_movements(db, rollup_entries)
+    _queue_events(db, events)
+
+async def receive_stock(
+    db: AsyncSession,
+    lines: List[Tuple[UUID, int]],
+    location: str = DEFAULT_LOCATION,
+    reference_id: Optional[UUID] = None,
+    notes: Optional[str] = None,
+) -> None:
+    """Book many (product_id, quantity) receipts with a fixed number of statements."""
+    if not lines:
+        return
+
+    now = await ledger_clock(db)
+    movements = [
+        {
+            "id": uuid.uuid4(),
+            "product_id": product_id,
+            "location": location,
+            "type": MovementType.IN,
+            "quantity": quantity,
+            "reference_id": reference_id,
+            "notes": notes,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for product_id, quantity in lines
+    ]
+    await db.execute(insert(StockMovement).values(movements))
+
+    # ON CONFLICT may touch each level row only once per statement
+    totals: Dict[UUID, int] = {}
+    for product_id, quantity in lines:
+        totals[product_id] = totals.get(product_id, 0) + quantity
+    stmt = insert(StockLevel).values([
+        {
+            "id": uuid.uuid4(),
+            "product_id": product_id,
+            "location": location,
+            "quantity": quantity,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for product_id, quantity in sorted(totals.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_stock_levels_product_location",
+        set_={"quantity": StockLevel.quantity + stmt.excluded.quantity, "updated_at": now},
+    ).returning(StockLevel.product_id, StockLevel.quantity)
+    levels = dict((await db.execute(stmt)).all())
+    await refresh_stock_summaries(db, totals.keys())
+    await record_movements(db, [
+        (now.date(), product_id, location, MovementType.IN, quantity)
+        for product_id, quantity in lines
+    ])
+    # Each event carries the level after the whole receipt
+    _queue_events(db, [_event(movement, levels[movement["product_id"]]) for movement in movements])
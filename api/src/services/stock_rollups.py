@@ -0,0 +1,167 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+from sqlalchemy import Date, case, cast, delete, func, select, union_all
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.core.database import async_session
+from src.models import (
+    CategoryMovementDaily,
+    MovementType,
+    Product,
+    ProductMovementDaily,
+    StockMovement,
+)
+
+# (day, product_id, location, type, quantity)
+RollupEntry = Tuple[date, UUID, str, MovementType, int]
+
+# Days, counting today, whose category totals are read live from the
+# product rollups; older days are settled in category_movement_daily
+LIVE_CATEGORY_DAYS = 2
+
+# Arbitrary pg_advisory_xact_lock key serializing category rollup rebuilds
+CATEGORY_ROLLUP_LOCK = 720_015
+
+def _add_totals(stmt, model):
+    """Turn an insert into rollup rows into an additive upsert."""
+    return stmt.on_conflict_do_update(
+        index_elements=list(model.__table__.primary_key.columns),
+        set_={
+            "quantity": model.quantity + stmt.excluded.quantity,
+            "movement_count": model.movement_count + stmt.excluded.movement_count,
+        },
+    )
+
+def _volume(type, quantity):
+    """Quantity a movement adds to the charted volume.
+
+    An ADJUST carries the level it set, not how much it changed, so it is
+    counted as a movement but adds no volume.
+    """
+    return case((type == MovementType.ADJUST, 0), else_=quantity)
+
+def _category_rows(source):
+    """Product-level rollup rows of ``source`` summed per category."""
+    return select(
+        source.c.day,
+        Product.category_id,
+        source.c.location,
+        source.c.type,
+        func.sum(source.c.quantity).label("quantity"),
+        func.sum(source.c.movement_count).label("movement_count"),
+    ).select_from(source).join(
+        Product, Product.id == source.c.product_id
+    ).group_by(source.c.day, Product.category_id, source.c.location, source.c.type)
+
+async def record_movements(db: AsyncSession, entries: Iterable[RollupEntry]) -> None:
+    """Add movements to the daily product rollups; one statement.
+
+    Category rows are not touched here: every writer in a category would
+    queue on the same row. They are built from these rows by
+    rollup_categories, and read live for the most recent days.
+    """
+    totals: Dict[tuple, List[int]] = {}
+    for day, product_id, location, type, quantity in entries:
+        type = MovementType(type)
+        total = totals.setdefault((day, product_id, location, type), [0, 0])
+        total[0] += 0 if type == MovementType.ADJUST else quantity
+        total[1] += 1
+    if not totals:
+        return
+
+    # Sorted so concurrent writers take row locks in the same order
+    stmt = insert(ProductMovementDaily).values([
+        {
+            "day": day,
+            "product_id": product_id,
+            "location": location,
+            "type": type,
+            "quantity": quantity,
+            "movement_count": count,
+        }
+        for (day, product_id, location, type), (quantity, count) in sorted(totals.items())
+    ])
+    await db.execute(_add_totals(stmt, ProductMovementDaily))
+
+async def rollup_category_range(db: AsyncSession, start: date, end: date) -> None:
+    """Rebuild category rows for days in [start, end) from the product rollups."""
+    await db.execute(select(func.pg_advisory_xact_lock(CATEGORY_ROLLUP_LOCK)))
+    await db.execute(delete(CategoryMovementDaily).where(
+        CategoryMovementDaily.day >= start,
+        CategoryMovementDaily.day < end,
+    ))
+    product_rows = select(ProductMovementDaily).where(
+        ProductMovementDaily.day >= start,
+        ProductMovementDaily.day < end,
+    ).subquery()
+    await db.execute(insert(CategoryMovementDaily).from_select(
+        ["day", "category_id", "location", "type", "quantity", "movement_count"],
+        _category_rows(product_rows),
+    ))
+
+def live_start(today: Optional[date] = None) -> date:
+    return (today or datetime.utcnow().date()) - timedelta(days=LIVE_CATEGORY_DAYS - 1)
+
+async def rollup_categories() -> None:
+    """Settle the category rows of the live days; run periodically.
+
+    Each run rebuilds them from the product rollups, so a day's rows are
+    final once it has left the live window.
+    """
+    async with async_session() as session:
+        start = live_start()
+        await rollup_category_range(session, start, start + timedelta(days=LIVE_CATEGORY_DAYS))
+        await session.commit()
+
+def category_rollup(today: Optional[date] = None):
+    """Daily category totals: settled rows, plus product rollups summed per
+    category for the live days. Columns match category_movement_daily.
+    """
+    since = live_start(today)
+    settled = select(
+        CategoryMovementDaily.day,
+        CategoryMovementDaily.category_id,
+        CategoryMovementDaily.location,
+        CategoryMovementDaily.type,
+        CategoryMovementDaily.quantity,
+        CategoryMovementDaily.movement_count,
+    ).where(CategoryMovementDaily.day < since)
+    recent = select(ProductMovementDaily).where(ProductMovementDaily.day >= since).subquery()
+    return union_all(settled, _category_rows(recent)).subquery("category_rollup")
+
+async def backfill_range(db: AsyncSession, start: date, end: date) -> None:
+    """Rebuild both rollups for days in [start, end) from stock_movements."""
+    await db.execute(delete(ProductMovementDaily).where(
+        ProductMovementDaily.day >= start,
+        ProductMovementDaily.day < end,
+    ))
+
+    day = cast(StockMovement.created_at, Date)
+    await db.execute(
+        insert(ProductMovementDaily).from_select(
+            ["day", "product_id", "location", "type", "quantity", "movement_count"],
+            select(
+                day,
+                StockMovement.product_id,
+                StockMovement.location,
+                StockMovement.type,
+                func.sum(_volume(StockMovement.type, StockMovement.quantity)),
+                func.count(),
+            ).where(
+                StockMovement.created_at >= start,
+                StockMovement.created_at < end,
+            ).group_by(day, StockMovement.product_id, StockMovement.location, StockMovement.type),
+        )
+    )
+    await rollup_category_range(db, start, end)
+
+async def backfill_rollups(start: date, end: date) -> None:
+    """Rebuild rollups one month per transaction, so long histories stay cheap to lock."""
+    month = start.replace(day=1)
+    while month < end:
+        next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        async with async_session() as session:
+            await backfill_range(session, max(month, start), min(next_month, end))
+            await session.commit()
+        month = next_month
@@ -0,0 +1,156 @@
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+from sqlalchemy import and_, case, delete, func, insert, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models import MovementType, StockLevel, StockMovement, StockSnapshot, StockSnapshotItem
+from src.services.stock_ledger import LEDGER_LOCK
+
+async def take_snapshot(db: AsyncSession) -> StockSnapshot:
+    """Copy every stock level into a new snapshot; one insert ... select.
+
+    Holds the ledger lock exclusively, so in-flight movements commit first
+    and new ones wait. ``taken_at`` is read from the database clock under
+    that lock, as movement ``created_at`` is by ledger writers, so a
+    movement is in the copy exactly when it is stamped before ``taken_at``.
+    The lock is released when the caller commits.
+    """
+    await db.execute(select(func.pg_advisory_xact_lock(LEDGER_LOCK)))
+    taken_at = (await db.execute(select(func.timezone("utc", func.clock_timestamp())))).scalar_one()
+    snapshot = StockSnapshot(taken_at=taken_at)
+    db.add(snapshot)
+    await db.flush()
+    await db.execute(
+        insert(StockSnapshotItem).from_select(
+            ["snapshot_id", "product_id", "location", "quantity"],
+            select(
+                literal(snapshot.id),
+                StockLevel.product_id,
+                StockLevel.location,
+                StockLevel.quantity,
+            ),
+        )
+    )
+    return snapshot
+
+async def prune_snapshots(db: AsyncSession, before: datetime) -> int:
+    """Delete snapshots taken before ``before``, items included; the caller commits.
+
+    As-of queries older than the oldest remaining snapshot still work, by
+    replaying the ledger from the start.
+    """
+    result = await db.execute(delete(StockSnapshot).where(StockSnapshot.taken_at < before))
+    return result.rowcount
+
+def stock_levels_as_of(
+    as_of: datetime,
+    snapshot: Optional[StockSnapshot],
+    product_id: Optional[UUID] = None,
+    location: Optional[str] = None,
+):
+    """Query for stock levels at ``as_of``: the snapshot plus later movements.
+
+    Only movements between the snapshot and ``as_of`` are read. An ADJUST
+    sets the quantity outright, so per (product, location) the latest
+    adjustment in that window replaces the snapshot quantity and only the
+    IN/OUT movements from it onwards are summed. "Latest" and "onwards"
+    follow ``seq``, the order movements were applied in; ``created_at``
+    ties within a batch. Without a snapshot the whole ledger is replayed.
+    """
+    window = select(
+        StockMovement.id,
+        StockMovement.product_id,
+        StockMovement.location,
+        StockMovement.type,
+        StockMovement.quantity,
+        StockMovement.seq,
+    ).where(StockMovement.created_at <= as_of)
+    if snapshot is not None:
+        window = window.where(StockMovement.created_at > snapshot.taken_at)
+    if product_id:
+        window = window.where(StockMovement.product_id == product_id)
+    if location:
+        window = window.where(StockMovement.location == location)
+    window = window.cte("movement_window")
+
+    last_adjust = select(
+        window.c.product_id,
+        window.c.location,
+        window.c.quantity,
+        window.c.seq,
+    ).where(
+        window.c.type == MovementType.ADJUST
+    ).order_by(
+        window.c.product_id,
+        window.c.location,
+        window.c.seq.desc(),
+    ).distinct(window.c.product_id, window.c.location).cte("last_adjust")
+
+    signed = case(
+        (window.c.type == MovementType.IN, window.c.quantity),
+        (window.c.type == MovementType.OUT, -window.c.quantity),
+        # Transfer rows are already signed
+        (window.c.type == MovementType.TRANSFER, window.c.quantity),
+        else_=0,
+    )
+    # The adjustment row itself is kept (it contributes 0) so keys whose
+    # last movement is an ADJUST still produce a row
+    deltas = select(
+        window.c.product_id,
+        window.c.location,
+        func.sum(signed).label("delta"),
+        last_adjust.c.quantity.label("adjusted"),
+    ).select_from(
+        window.outerjoin(last_adjust, and_(
+            last_adjust.c.product_id == window.c.product_id,
+            last_adjust.c.location == window.c.location,
+        ))
+    ).where(
+        (last_adjust.c.seq.is_(None)) | (window.c.seq >= last_adjust.c.seq)
+    ).group_by(
+        window.c.product_id, window.c.location, last_adjust.c.quantity
+    ).cte("deltas")
+
+    if snapshot is None:
+        return select(
+            deltas.c.product_id,
+            deltas.c.location,
+            (func.coalesce(deltas.c.adjusted, 0) + deltas.c.delta).label("quantity"),
+        ).order_by(deltas.c.product_id, deltas.c.location)
+
+    base = select(
+        StockSnapshotItem.product_id,
+        StockSnapshotItem.location,
+        StockSnapshotItem.quantity,
+    ).where(StockSnapshotItem.snapshot_id == snapshot.id)
+    if product_id:
+        base = base.where(StockSnapshotItem.product_id == product_id)
+    if location:
+        base = base.where(StockSnapshotItem.location == location)
+    base = base.cte("base")
+
+    product_col = func.coalesce(base.c.product_id, deltas.c.product_id)
+    location_col = func.coalesce(base.c.location, deltas.c.location)
+    return select(
+        product_col.label("product_id"),
+        location_col.label("location"),
+        (
+            func.coalesce(deltas.c.adjusted, base.c.quantity, 0)
+            + func.coalesce(deltas.c.delta, 0)
+        ).label("quantity"),
+    ).select_from(
+        base.join(deltas, and_(
+            deltas.c.product_id == base.c.product_id,
+            deltas.c.location == base.c.location,
+        ), full=True)
+    ).order_by(product_col, location_col)
+
+async def nearest_snapshot(db: AsyncSession, as_of: datetime) -> Optional[StockSnapshot]:
+    """The latest snapshot taken at or before ``as_of``."""
+    result = await db.execute(
+        select(StockSnapshot)
+        .where(StockSnapshot.taken_at <= as_of)
+        .order_by(StockSnapshot.taken_at.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
@@ -0,0 +1,163 @@
+"""Background jobs, run by Celery workers (or in-process when JOBS_EAGER)."""
+import asyncio
+import glob
+import os
+import time
+import zipfile
+from datetime import date, timedelta
+from uuid import UUID
+from pydantic import validate_call
+from src.core.config import settings
+from src.core.database import async_session
+from src.core.etag import bump_collection_version
+from src.core.jobs import JobContext, job
+from src.core.response_cache import response_cache
+from src.models import stock_levels_version
+from src.services.exports import EXPORT_QUERIES, write_export
+from src.services.po_documents import DOCUMENT_DIR, render_supplier_documents
+from src.services.product_attributes import rebuild_attribute_index
+from src.services.product_import import ImportJob, run_import
+from src.services.purchase_orders import create_orders
+from src.services.replenishment import ReorderPolicy, suggest_reorders
+from src.services.stock_alerts import reconcile_stock_summaries
+from src.services.stock_rollups import backfill_rollups, rollup_categories
+from src.services.stock_snapshots import prune_snapshots, take_snapshot
+
+# Suggested lines kept in a job result; the orders hold the full set
+SUGGESTION_RESULT_LINES = 1_000
+
+EXPORT_DIR = os.path.join(settings.UPLOAD_DIR, "exports")
+
+# Files jobs leave for download; removed once their job record has expired
+JOB_ARTIFACTS = [
+    os.path.join(EXPORT_DIR, "*"),
+    os.path.join(DOCUMENT_DIR, "supplier-*.zip"),
+]
+
+@job("stock.reconcile_alerts")
+async def reconcile_alerts_job(ctx: JobContext) -> dict:
+    await reconcile_stock_summaries()
+    return {"reconciled": True}
+
+@job("stock.snapshot")
+async def snapshot_job(ctx: JobContext) -> dict:
+    """Take a snapshot and drop those older than SNAPSHOT_RETENTION_DAYS."""
+    async with async_session() as session:
+        snapshot = await take_snapshot(session)
+        await session.commit()
+        pruned = 0
+        if settings.SNAPSHOT_RETENTION_DAYS:
+            cutoff = snapshot.taken_at - timedelta(days=settings.SNAPSHOT_RETENTION_DAYS)
+            pruned = await prune_snapshots(session, cutoff)
+            await session.commit()
+    return {"id": str(snapshot.id), "taken_at": snapshot.taken_at.isoformat(), "pruned": pruned}
+
+@job("stock.backfill_rollups")
+async def backfill_rollups_job(ctx: JobContext, start: str, end: str) -> dict:
+    await backfill_rollups(date.fromisoformat(start), date.fromisoformat(end))
+    return {"start": start, "end": end}
+
+@job("stock.rollup_categories")
+async def rollup_categories_job(ctx: JobContext) -> dict:
+    await rollup_categories()
+    return {"rolled_up": True}
+
+@job("products.rebuild_facets")
+async def rebuild_facets_job(ctx: JobContext) -> dict:
+    async with async_session() as session:
+        await rebuild_attribute_index(session)
+        await session.commit()
+    await response_cache.invalidate("products")
+    return {"rebuilt": True}
+
+@job("exports.write")
+async def export_job(ctx: JobContext, name: str, format: str, filters: dict) -> dict:
+    """Write an export under UPLOAD_DIR for download through the jobs API."""
+    # Filters arrive as JSON; validation turns them back into ids, dates and enums
+    query = validate_call(EXPORT_QUERIES[name])(**filters)
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = os.path.join(EXPORT_DIR, f"{name}-{ctx.id}.{format}")
+    rows = await write_export(query, format, path, settings.EXPORT_BATCH_SIZE, ctx.progress)
+    return {"rows": rows, "file": path, "filename": os.path.basename(path)}
+
+# Not retried: the spooled file is removed once the first attempt ends
+@job("products.import", max_attempts=1)
+async def import_products_job(ctx: JobContext, path: str) -> dict:
+    """Import a CSV spooled under UPLOAD_DIR; removes the file when done.
+
+    The spool directory must be shared between the API and the workers.
+    """
+    import_job = ImportJob(id=UUID(ctx.id))
+
+    async def report(import_job: ImportJob) -> None:
+        await ctx.progress(import_job.processed)
+
+    try:
+        async with async_session() as session:
+            with open(path, encoding="utf-8-sig", newline="") as stream:
+                await run_import(session, import_job, stream, settings.IMPORT_BATCH_SIZE, progress=report)
+            await bump_collection_version(session, stock_levels_version)
+    finally:
+        os.remove(path)
+        await response_cache.invalidate(*import_job.cache_tags())
+    return import_job.report()
+
+def _zip_files(path: str, files: list) -> None:
+    # PDFs are already compressed
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED) as archive:
+        for file in files:
+            archive.write(file, arcname=os.path.basename(file))
+
+@job("purchase_orders.render_supplier")
+async def render_supplier_documents_job(ctx: JobContext, supplier_id: str) -> dict:
+    """Render every order of a supplier and bundle the PDFs into one zip."""
+    async with async_session() as session:
+        files = await render_supplier_documents(session, UUID(supplier_id), ctx.progress)
+    path = os.path.join(DOCUMENT_DIR, f"supplier-{supplier_id}-{ctx.id}.zip")
+    await asyncio.to_thread(_zip_files, path, files)
+    return {"orders": len(files), "file": path, "filename": f"purchase-orders-{supplier_id}.zip"}
+
+def _remove_older_than(patterns: list, cutoff: float) -> int:
+    removed = 0
+    for pattern in patterns:
+        for path in glob.glob(pattern):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass  # Removed by another worker
+    return removed
+
+@job("files.cleanup")
+async def cleanup_artifacts_job(ctx: JobContext) -> dict:
+    """Delete job downloads older than JOB_TTL_SECONDS, whose records are gone."""
+    cutoff = time.time() - settings.JOB_TTL_SECONDS
+    removed = await asyncio.to_thread(_remove_older_than, JOB_ARTIFACTS, cutoff)
+    return {"removed": removed}
+
+@job("purchase_orders.suggest_reorders")
+async def suggest_reorders_job(ctx: JobContext, dry_run: bool = False) -> dict:
+    """Turn reorder suggestions into one draft order per supplier.
+
+    A product's supplier is the one it was last ordered from; products
+    never ordered before are counted in ``without_supplier`` and skipped,
+    as are products without a price above zero, in ``without_price``.
+    """
+    async with async_session() as session:
+        suggestions = await suggest_reorders(session, ReorderPolicy.from_settings())
+        order_ids = []
+        if suggestions["drafts"] and not dry_run:
+            notes = f"Reorder suggestions of {date.today().isoformat()}"
+            for draft in suggestions["drafts"]:
+                draft.notes = notes
+            order_ids = await create_orders(session, suggestions["drafts"])
+        await session.commit()
+    return {
+        "products_analyzed": suggestions["products_analyzed"],
+        "without_supplier": suggestions["without_supplier"],
+        "without_price": suggestions["without_price"],
+        "suggested": len(suggestions["lines"]),
+        "orders": order_ids,
+        "lines": suggestions["lines"][:SUGGESTION_RESULT_LINES],
+    }
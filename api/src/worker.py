@@ -0,0 +1,77 @@
+"""Celery application and worker entry point.
+
+Run a worker with::
+
+    celery -A src.worker worker --loglevel=info
+
+or ``python -m src.worker``. Jobs are defined in ``src.tasks``.
+
+Periodic jobs are sent by Celery beat; run exactly one scheduler::
+
+    celery -A src.worker beat --loglevel=info
+
+Beat keeps each entry's last run time in its schedule file, so restarts
+and the number of API or worker processes do not change how often a job
+runs.
+"""
+import asyncio
+from typing import Awaitable, Optional, TypeVar
+from celery import Celery
+from celery.signals import worker_process_init
+from src.core.config import settings
+
+T = TypeVar("T")
+
+celery_app = Celery(
+    "inventory",
+    broker=settings.CELERY_BROKER_URL,
+    backend=settings.CELERY_RESULT_BACKEND,
+    include=["src.tasks"],
+)
+celery_app.conf.update(
+    task_serializer="json",
+    result_serializer="json",
+    accept_content=["json"],
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    task_always_eager=settings.JOBS_EAGER,
+    result_expires=settings.JOB_TTL_SECONDS,
+)
+
+# Job name -> interval in seconds; an interval of 0 disables the entry
+PERIODIC_JOBS = {
+    "stock.reconcile_alerts": settings.ALERT_RECONCILE_INTERVAL_SECONDS,
+    "stock.snapshot": settings.SNAPSHOT_INTERVAL_SECONDS,
+    "stock.rollup_categories": settings.CATEGORY_ROLLUP_INTERVAL_SECONDS,
+    "purchase_orders.suggest_reorders": settings.REORDER_INTERVAL_SECONDS,
+    "files.cleanup": settings.ARTIFACT_CLEANUP_INTERVAL_SECONDS,
+}
+
+celery_app.conf.beat_schedule = {
+    name: {"task": "jobs.run_scheduled", "schedule": float(interval), "args": [name]}
+    for name, interval in PERIODIC_JOBS.items()
+    if interval
+}
+
+# One event loop per worker process; the engine's pooled connections and
+# the Redis client are bound to the loop they were opened on
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def run_async(coro: Awaitable[T]) -> T:
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(coro)
+
+@worker_process_init.connect
+def _reset_after_fork(**kwargs) -> None:
+    """Drop connections inherited from the parent process."""
+    global _loop
+    from src.core.database import engine
+
+    _loop = None
+    engine.sync_engine.dispose(close=False)
+
+if __name__ == "__main__":
+    celery_app.worker_main(["worker", "--loglevel=info"])
@@ -0,0 +1,58 @@
+from contextlib import contextmanager
+from typing import Iterator, List
+import pytest
+from sqlalchemy import event
+from src.core.database import async_session, engine
+from src.schemas import StockMovementBatchItem
+from src.services.stock_ledger import apply_movement_batch, receive_stock
+
+SIZES = [1, 10, 100]
+
+@contextmanager
+def count_statements() -> Iterator[List[str]]:
+    statements: List[str] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+@pytest.fixture
+async def products(make_product):
+    return [await make_product() for _ in range(10)]
+
+async def test_batch_statement_count_does_not_grow_with_batch_size(products):
+    counts = {}
+    for size in SIZES:
+        items = [
+            StockMovementBatchItem(
+                product_id=products[index % len(products)],
+                type="in",
+                quantity=1,
+                location=f"size-{size}-{index // len(products)}",
+            )
+            for index in range(size)
+        ]
+        async with async_session() as session:
+            with count_statements() as statements:
+                await apply_movement_batch(session, items)
+            await session.commit()
+        counts[size] = len(statements)
+
+    assert len(set(counts.values())) == 1, counts
+
+async def test_receipt_statement_count_does_not_grow_with_line_count(products):
+    counts = {}
+    for size in SIZES:
+        lines = [(products[index % len(products)], index + 1) for index in range(size)]
+        async with async_session() as session:
+            with count_statements() as statements:
+                await receive_stock(session, lines, location=f"receipt-{size}")
+            await session.commit()
+        counts[size] = len(statements)
+
+    assert len(set(counts.values())) == 1, counts
@@ -0,0 +1,101 @@
+import asyncio
+import random
+from collections import defaultdict
+from sqlalchemy import select
+from src.core.database import async_session
+from src.models import MovementType, StockLevel, StockMovement
+from src.schemas import StockMovementBatchItem
+from src.services.stock_ledger import (
+    InsufficientStock,
+    apply_movement,
+    apply_movement_batch,
+    run_in_transaction,
+    transfer_stock,
+)
+
+WORKERS = 40
+MOVES_PER_WORKER = 10
+
+async def levels_of(product_id) -> dict:
+    async with async_session() as session:
+        result = await session.execute(
+            select(StockLevel.location, StockLevel.quantity).where(StockLevel.product_id == product_id)
+        )
+        return dict(result.all())
+
+async def ledger_of(product_id) -> dict:
+    """Per-location sum of the movements; transfers carry a signed quantity."""
+    async with async_session() as session:
+        result = await session.execute(
+            select(StockMovement.location, StockMovement.type, StockMovement.quantity)
+            .where(StockMovement.product_id == product_id)
+        )
+        totals = defaultdict(int)
+        for location, type, quantity in result:
+            totals[location] += -quantity if type == MovementType.OUT else quantity
+        return dict(totals)
+
+async def move(operation) -> bool:
+    """Run one movement in its own session; False when stock was short."""
+    async with async_session() as session:
+        try:
+            await run_in_transaction(session, lambda: operation(session))
+        except InsufficientStock:
+            return False
+        return True
+
+async def test_concurrent_sales_lose_no_updates(make_product):
+    product_id = await make_product()
+    stock = WORKERS * MOVES_PER_WORKER // 2
+    assert await move(lambda db: apply_movement(db, product_id, MovementType.IN, stock))
+
+    async def sell() -> int:
+        sold = 0
+        for _ in range(MOVES_PER_WORKER):
+            sold += await move(lambda db: apply_movement(db, product_id, MovementType.OUT, 1))
+        return sold
+
+    # Twice as many sales as there is stock: exactly half must succeed
+    sold = sum(await asyncio.gather(*(sell() for _ in range(WORKERS))))
+
+    assert sold == stock
+    assert await levels_of(product_id) == {"main": 0}
+    assert await ledger_of(product_id) == {"main": 0}
+
+async def test_concurrent_transfers_and_sales_keep_levels_and_ledger_equal(make_product):
+    product_id = await make_product()
+    locations = ["main", "store-1", "store-2"]
+    for location in locations:
+        assert await move(lambda db: apply_movement(db, product_id, MovementType.IN, 50, location=location))
+
+    async def worker(seed: int) -> int:
+        rng = random.Random(seed)
+        sold = 0
+        for _ in range(MOVES_PER_WORKER):
+            source, target = rng.sample(locations, 2)
+            quantity = rng.randint(1, 5)
+            if rng.random() < 0.25:
+                sold += quantity * await move(
+                    lambda db: apply_movement(db, product_id, MovementType.OUT, quantity, location=source)
+                )
+            else:
+                await move(lambda db: transfer_stock(db, product_id, quantity, source, target))
+        return sold
+
+    sold = sum(await asyncio.gather(*(worker(seed) for seed in range(WORKERS))))
+
+    levels = await levels_of(product_id)
+    assert sum(levels.values()) == 150 - sold
+    assert all(quantity >= 0 for quantity in levels.values())
+    assert levels == await ledger_of(product_id)
+
+async def test_rejected_batch_leaves_no_level_row(make_product):
+    product_id = await make_product()
+    async with async_session() as session:
+        [result] = await apply_movement_batch(session, [
+            StockMovementBatchItem(product_id=product_id, type="out", quantity=1, location="store-9"),
+        ])
+        await session.commit()
+
+    assert result.status == "rejected"
+    assert await levels_of(product_id) == {}
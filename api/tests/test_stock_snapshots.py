@@ -0,0 +1,50 @@
+from sqlalchemy import func, select
+from src.core.database import async_session
+from src.schemas import StockMovementBatchItem
+from src.services.stock_ledger import apply_movement_batch
+from src.services.stock_snapshots import stock_levels_as_of, take_snapshot
+
+# Batch items share created_at and get random ids, so any order derived
+# from those would get some of these wrong
+BATCHES = [
+    ([("adjust", 10), ("out", 3)], 7),
+    ([("adjust", 10), ("adjust", 4), ("out", 1)], 3),
+    ([("in", 5), ("adjust", 2), ("in", 1), ("adjust", 6), ("out", 6)], 0),
+]
+REPEATS = 5
+
+async def apply(product_id, movements) -> int:
+    async with async_session() as session:
+        results = await apply_movement_batch(session, [
+            StockMovementBatchItem(product_id=product_id, type=type, quantity=quantity)
+            for type, quantity in movements
+        ])
+        await session.commit()
+    assert all(result.status == "applied" for result in results), results
+    return results[-1].quantity
+
+async def level_as_of_now(product_id, snapshot=None) -> int:
+    async with async_session() as session:
+        now = (await session.execute(select(func.timezone("utc", func.clock_timestamp())))).scalar_one()
+        rows = (await session.execute(stock_levels_as_of(now, snapshot, product_id=product_id))).all()
+    assert len(rows) == 1, rows
+    return rows[0].quantity
+
+async def test_as_of_replays_a_mixed_batch_in_applied_order(make_product):
+    for movements, expected in BATCHES:
+        for _ in range(REPEATS):
+            product_id = await make_product()
+            assert await apply(product_id, movements) == expected
+            assert await level_as_of_now(product_id) == expected
+
+async def test_as_of_replays_a_mixed_batch_after_a_snapshot(make_product):
+    products = [await make_product() for _ in range(REPEATS)]
+    for product_id in products:
+        await apply(product_id, [("in", 20)])
+    async with async_session() as session:
+        snapshot = await take_snapshot(session)
+        await session.commit()
+
+    for product_id in products:
+        assert await apply(product_id, [("out", 5), ("adjust", 10), ("out", 3)]) == 7
+        assert await level_as_of_now(product_id, snapshot) == 7